@@ -0,0 +1,6 @@
+"""Benchmarks for Compose. Run from the repository root, for example::
+
+    python -m benchmarks.logging_overhead
+
+`benchmarks.suite` covers the resolution engine as a whole and writes JSON results that can be compared between runs.
+"""
@@ -0,0 +1,69 @@
+"""Compares the cost of `Compose.provide` with the default logger against the stack walking diagnostic logger.
+
+    python -m benchmarks.logging_overhead [--number N]
+"""
+import argparse
+import timeit
+from dataclasses import dataclass
+from typing import Optional
+
+from compose import Compose
+from compose.bundling import Bind
+from compose.extras import logging as compose_logging
+
+
+class Interface(object):
+    pass
+
+
+class Implementation(Interface):
+    pass
+
+
+@dataclass
+class Service(object):
+    dependency: Interface
+    optional: Optional[int] = None
+
+
+@dataclass
+class Root(object):
+    service: Service
+
+
+def build():
+    compose = Compose()
+    with compose.registry():
+        Bind[Interface].to(Implementation).as_singleton()
+        Bind[Service].to_self()
+        Bind[Root].to_self()
+    return compose
+
+
+def measure(compose, number):
+    compose.provide(Root)
+    return min(timeit.repeat(lambda: compose.provide(Root), number=number, repeat=5)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=200)
+    options = parser.parse_args()
+
+    compose = build()
+    previous = compose_logging.DEBUG
+    try:
+        compose_logging.set_diagnostic(False)
+        production = measure(compose, options.number)
+        compose_logging.set_diagnostic(True)
+        diagnostic = measure(compose, options.number)
+    finally:
+        compose_logging.set_diagnostic(previous)
+
+    print(f"production logging: {production * 1e6:10.1f} us/provide")
+    print(f"diagnostic logging: {diagnostic * 1e6:10.1f} us/provide")
+    print(f"diagnostic overhead: {(diagnostic - production) * 1e6:9.1f} us/provide ({diagnostic / production:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
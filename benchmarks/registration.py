@@ -0,0 +1,38 @@
+"""Times registering bindings with `Bind[...]` inside `Compose.registry()` for growing numbers of bindings. The time
+per binding should stay flat.
+
+    python -m benchmarks.registration [--sizes 1000 2000 5000 10000]
+"""
+import argparse
+import time
+
+from compose import Compose
+from compose.bundling import Bind
+
+
+def make_classes(count):
+    return [type(f"Service{idx}", (object,), {}) for idx in range(count)]
+
+
+def register(classes):
+    compose = Compose()
+    start = time.perf_counter()
+    with compose.registry():
+        for kls in classes:
+            Bind[kls].to_self()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000])
+    options = parser.parse_args()
+
+    for size in options.sizes:
+        classes = make_classes(size)
+        elapsed = min(register(classes) for _ in range(3))
+        print(f"{size:6d} bindings: {elapsed * 1e3:9.1f} ms ({elapsed / size * 1e6:6.1f} us/binding)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Cold starts a singleton from many threads at once and checks it is only built once.
+
+    python -m benchmarks.singleton_contention [--threads N] [--rounds N]
+"""
+import argparse
+import threading
+import time
+
+from compose import Compose
+from compose.bundling import Bind
+
+
+class Pool(object):
+    built = 0
+    built_lock = threading.Lock()
+
+    def __init__(self):
+        # long enough for every thread to pile up on the binding
+        time.sleep(0.01)
+        with Pool.built_lock:
+            Pool.built += 1
+
+
+class Service(object):
+    def __init__(self, pool: Pool):
+        self.pool = pool
+
+
+def cold_start(threads):
+    compose = Compose()
+    with compose.registry():
+        Bind[Pool].to_self().as_singleton()
+        Bind[Service].to_self()
+
+    Pool.built = 0
+    barrier = threading.Barrier(threads)
+    pools = []
+
+    def worker():
+        barrier.wait()
+        pools.append(compose.provide(Service).pool)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    elapsed = time.perf_counter() - start
+
+    assert Pool.built == 1, f"singleton built {Pool.built} times"
+    assert all(pool is pools[0] for pool in pools), "threads were handed different singletons"
+    return elapsed, compose
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--number", type=int, default=10000)
+    options = parser.parse_args()
+
+    elapsed = [cold_start(options.threads)[0] for _ in range(options.rounds)]
+    print(f"{options.rounds} cold starts of {options.threads} threads, singleton built once each time")
+    print(f"cold start: {min(elapsed) * 1e3:8.2f} ms best, {max(elapsed) * 1e3:8.2f} ms worst")
+
+    _, compose = cold_start(options.threads)
+    start = time.perf_counter()
+    for _ in range(options.number):
+        compose.provide(Pool)
+    print(f"warm provide: {(time.perf_counter() - start) / options.number * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""Times the resolution engine on typical graph shapes and compares each case with doing the same work by hand.
+
+    python -m benchmarks.suite [--output results.json] [--compare previous.json] [--case NAME ...]
+
+Every case reports the best time per operation out of several repeats for Compose and for the hand written
+equivalent, and the overhead of Compose over the latter. Results are written as JSON so runs can be compared with
+--compare.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+from itertools import count
+from typing import Callable, Dict, Generic, Iterator, List, Tuple, TypeVar
+
+from compose import Compose
+from compose.bundling import AutoBundle, Bind, Binding, FactoryBundle, search_target
+
+Case = Tuple[Callable[[], object], Callable[[], object]]
+CASES: Dict[str, Callable[[], Case]] = {}
+# Undo what a case set up, run once it has been timed
+CLEANUPS: List[Callable[[], None]] = []
+_packages = count()
+
+
+def case(name):
+    def register(build):
+        CASES[name] = build
+        return build
+
+    return register
+
+
+def chain_classes(depth):
+    """Classes each needing the one before it"""
+    classes = [type("Link0", (object,), {})]
+    for idx in range(1, depth):
+        classes.append(_needs(f"Link{idx}", {"previous": classes[-1]}))
+    return classes
+
+
+def _needs(name, requirements: Dict[str, type]):
+    """A class whose __init__ takes the given requirements as annotated keyword arguments"""
+    params = ", ".join(requirements)
+    namespace = {}
+    exec(f"def __init__(self, {params}):\n    self.__dict__.update(locals())\n", namespace)
+    init = namespace["__init__"]
+    init.__annotations__ = dict(requirements)
+    return type(name, (object,), {"__init__": init})
+
+
+def compose_for(classes, singleton=False):
+    compose = Compose()
+    with compose.registry():
+        for kls in classes:
+            binding = Bind[kls].to_self()
+            if singleton:
+                binding.as_singleton()
+    return compose
+
+
+@case("deep_chain")
+def deep_chain():
+    classes = chain_classes(20)
+    compose = compose_for(classes)
+
+    def by_hand():
+        obj = classes[0]()
+        for kls in classes[1:]:
+            obj = kls(previous=obj)
+        return obj
+
+    return lambda: compose.provide(classes[-1]), by_hand
+
+
+@case("wide_fan_out")
+def wide_fan_out():
+    leaves = [type(f"Leaf{idx}", (object,), {}) for idx in range(30)]
+    root = _needs("Root", {f"leaf{idx}": kls for idx, kls in enumerate(leaves)})
+    compose = compose_for(leaves + [root])
+    return lambda: compose.provide(root), lambda: root(**{f"leaf{idx}": kls() for idx, kls in enumerate(leaves)})
+
+
+@case("diamond")
+def diamond():
+    # four layers of four, every class needing every class of the layer below
+    layers = [[type(f"Base{idx}", (object,), {}) for idx in range(4)]]
+    for level in range(1, 4):
+        below = layers[-1]
+        layers.append([_needs(f"Layer{level}_{idx}", {f"dep{dep}": kls for dep, kls in enumerate(below)})
+                       for idx in range(4)])
+    top = _needs("Top", {f"dep{dep}": kls for dep, kls in enumerate(layers[-1])})
+    compose = compose_for([kls for layer in layers for kls in layer] + [top])
+
+    def build(kls, level):
+        if level == 0:
+            return kls()
+        return kls(**{f"dep{dep}": build(below, level - 1) for dep, below in enumerate(layers[level - 1])})
+
+    return lambda: compose.provide(top), lambda: build(top, len(layers))
+
+
+class Plugin(object):
+    pass
+
+
+class Host(object):
+    def __init__(self, plugins: List[Plugin]):
+        self.plugins = plugins
+
+
+@case("multi_binding_list")
+def multi_binding_list():
+    plugins = [type(f"Plugin{idx}", (Plugin,), {}) for idx in range(10)]
+    compose = Compose()
+    with compose.registry():
+        Bind[Plugin].to_multiple(*plugins)
+        Bind[Host].to_self()
+    return lambda: compose.provide(Host), lambda: Host([kls() for kls in plugins])
+
+
+class Dispatcher(object):
+    def __init__(self, plugins: Iterator[Plugin]):
+        self.plugins = plugins
+
+
+@case("streamed_first_plugin")
+def streamed_first_plugin():
+    # only the first of 100 plugins is ever used, the rest are not built
+    plugins = [type(f"Plugin{idx}", (Plugin,), {}) for idx in range(100)]
+    compose = Compose()
+    with compose.registry():
+        Bind[Plugin].to_multiple(*plugins)
+        Bind[Dispatcher].to_self()
+    return (lambda: next(compose.provide(Dispatcher).plugins),
+            lambda: next(Dispatcher(kls() for kls in reversed(plugins)).plugins))
+
+
+T = TypeVar("T")
+
+
+class User(object):
+    pass
+
+
+class Repository(Generic[T]):
+    pass
+
+
+class UserRepository(Repository[User]):
+    pass
+
+
+@case("generic_matching")
+def generic_matching():
+    binding = Binding(UserRepository).to_self()
+    _, templates = search_target(Repository[User])
+    return (lambda: binding.matches(UserRepository, templates=templates),
+            lambda: issubclass(UserRepository, UserRepository) and issubclass(User, User))
+
+
+@case("transient")
+def transient():
+    classes = chain_classes(5)
+    compose = compose_for(classes)
+    return lambda: compose.provide(classes[-1]), chain_by_hand(classes)
+
+
+@case("singleton")
+def singleton():
+    classes = chain_classes(5)
+    compose = compose_for(classes, singleton=True)
+    built = chain_by_hand(classes)()
+    return lambda: compose.provide(classes[-1]), lambda: built
+
+
+def chain_by_hand(classes):
+    def build():
+        obj = classes[0]()
+        for kls in classes[1:]:
+            obj = kls(previous=obj)
+        return obj
+
+    return build
+
+
+@case("stacked_bundles")
+def stacked_bundles():
+    classes = chain_classes(5)
+    bundle = FactoryBundle()
+    with bundle.registry():
+        for kls in classes:
+            Bind[kls].to_self()
+    # the bindings sit in the bottom bundle under 50 others that have to be looked through first
+    others = []
+    for idx in range(50):
+        other = FactoryBundle()
+        with other.registry():
+            Bind[type(f"Unrelated{idx}", (object,), {})].to_self()
+        others.append(other)
+    compose = Compose(bundle, *others)
+    return lambda: compose.provide(classes[-1]), chain_by_hand(classes)
+
+
+@case("child_override")
+def child_override():
+    # a container per request overriding one binding of the parent
+    classes = chain_classes(5)
+    compose = compose_for(classes)
+    override = classes[0]
+
+    def per_request():
+        child = compose.child()
+        with child.registry():
+            Bind[override].to_self()
+        return child.provide(classes[-1])
+
+    return per_request, chain_by_hand(classes)
+
+
+@case("registration")
+def registration():
+    classes = [type(f"Registered{idx}", (object,), {}) for idx in range(1000)]
+
+    def register():
+        compose = Compose()
+        with compose.registry():
+            for kls in classes:
+                Bind[kls].to_self()
+        return compose
+
+    return register, lambda: {kls: kls for kls in classes}
+
+
+def generate_package(modules=50, classes=10) -> str:
+    """Writes a package of `modules` modules with `classes` classes each to a temporary directory on sys.path, removed
+    again once the case has run
+    """
+    root = tempfile.mkdtemp()
+    name = f"benchmark_discovery_{os.getpid()}_{next(_packages)}"
+    package = os.path.join(root, name)
+    os.makedirs(package)
+    open(os.path.join(package, "__init__.py"), "w").close()
+    for module in range(modules):
+        with open(os.path.join(package, f"module{module}.py"), "w") as source:
+            for kls in range(classes):
+                source.write(f"class Class{module}_{kls}(object):\n    pass\n\n\n")
+    sys.path.insert(0, root)
+
+    def remove():
+        sys.path.remove(root)
+        forget_modules(name, package=True)
+        shutil.rmtree(root, ignore_errors=True)
+
+    CLEANUPS.append(remove)
+    return name
+
+
+def forget_modules(name, package=False):
+    """Drops the modules of package `name` from sys.modules so the next import runs them again"""
+    for module in [module for module in sys.modules if module.startswith(name + ".") or (package and module == name)]:
+        del sys.modules[module]
+
+
+@case("discovery")
+def discovery():
+    # every call imports the modules again, like discovery at start up does
+    name = generate_package()
+    package = importlib.import_module(name)
+    modules = sorted(f"{name}.{module[:-3]}" for module in os.listdir(package.__path__[0])
+                     if module.endswith(".py") and module != "__init__.py")
+
+    def with_compose():
+        forget_modules(name)
+        return AutoBundle(package)
+
+    def by_hand():
+        forget_modules(name)
+        return [vars(importlib.import_module(module)) for module in modules]
+
+    return with_compose, by_hand
+
+
+@case("lazy_discovery")
+def lazy_discovery():
+    name = generate_package()
+    package = importlib.import_module(name)
+    return lambda: AutoBundle(package, lazy=True), lambda: os.listdir(package.__path__[0])
+
+
+def best(func, repeat):
+    func()
+    number = 1
+    # enough calls per repeat to take ~20ms
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed > 0.02 or number >= 1 << 20:
+            break
+        number *= 2
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number, number
+
+
+def run(names, repeat) -> Dict[str, dict]:
+    results = {}
+    for name in names:
+        try:
+            with_compose, by_hand = CASES[name]()
+            compose_time, number = best(with_compose, repeat)
+            manual_time, _ = best(by_hand, repeat)
+        finally:
+            while CLEANUPS:
+                CLEANUPS.pop()()
+        results[name] = {
+            "compose_us": compose_time * 1e6,
+            "manual_us": manual_time * 1e6,
+            "overhead_us": (compose_time - manual_time) * 1e6,
+            "ratio": compose_time / manual_time if manual_time else None,
+            "number": number,
+        }
+    return results
+
+
+def report(results, previous=None):
+    print(f"{'case':20s} {'compose us':>12s} {'by hand us':>12s} {'ratio':>8s}" + (f" {'change':>8s}" if previous else ""))
+    for name, result in results.items():
+        line = f"{name:20s} {result['compose_us']:12.2f} {result['manual_us']:12.2f} {result['ratio']:7.1f}x"
+        if previous:
+            before = previous.get(name)
+            if before:
+                line += f" {(result['compose_us'] / before['compose_us'] - 1) * 100:+7.1f}%"
+            else:
+                line += f" {'new':>8s}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="only run these cases")
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    # the engine logs at debug level on every resolution, keep that out of the numbers
+    import logging
+    logging.getLogger("compose").setLevel(logging.WARNING)
+
+    results = run(options.case or list(CASES), options.repeat)
+    previous = None
+    if options.compare:
+        with open(options.compare) as earlier:
+            previous = json.load(earlier)["cases"]
+    report(results, previous)
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump({
+                "timestamp": time.time(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cases": results,
+            }, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,53 @@
+import asyncio
 import inspect
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from dataclasses import fields
 from itertools import chain
-from typing import TypeVar, Type
+from typing import Dict, Iterator, List, Optional, TypeVar, Type
 
 
-from .bundling import ComposeBundle, FactoryBundle, bundle_key
+from .bundling import ComposeBundle, FactoryBundle, registering, search_target
+from .caching import InstanceCache
 from .context import InstantiationContext
-from .exceptions import TooManyProviders, RequirementNotFound
+from .exceptions import ComposeError, FrozenError, TooManyProviders, RequirementNotFound, WarmupError
 from .extras import LocationInfo, clsname
 from .extras.generics import *
+from .extras.logging import logger
 from .extras.undef import Undefined
+from .freezing import FrozenCompose, freeze
+from .metrics import Metrics, type_name
+from .tracing import Tracer
 from .util import walk
 from .modifiers import Required, Lazy
+from .proxying import unwrap
+from .planning import ResolutionPlan, binding_requirements, dependency_levels
+from .scoping import Scope
+from .validation import validate
 
 
 
 __all__ = [
     'Compose',
     'Required',
-    'Lazy'
+    'Lazy',
+    'unwrap'
 ]
 
 
 
 
 class Compose(object):
+    # Set by `enable_stats`
+    _metrics: Optional[Metrics] = None
+    # Set by `enable_tracing`
+    _tracer: Optional[Tracer] = None
+    # Set on the containers made by `child`
+    _parent: Optional['Compose'] = None
+    # The children with bindings of their own by id, told when this container's plans go stale
+    _children: Optional[weakref.WeakValueDictionary] = None
 
     @contextmanager
     def registry(self, bundle=None):
@@ -33,17 +55,20 @@ class Compose(object):
          automatically add the binding to the Bundle passed into the context.
         :return:
         """
+        if getattr(self, "_frozen", False):
+            raise FrozenError(f"{clsname(self)} is frozen, bindings can not be changed", location=self)
         if bundle is not None:
             self.register(bundle)
         else:
+            if self._parent is not None:
+                self._overlay()
             bundle = self._base_bundle
-        stack = inspect.stack()
-        stack[2].frame.f_locals[bundle_key] = bundle
-        yield bundle
-        del stack[2].frame.f_locals[bundle_key]
+        with registering(bundle):
+            yield bundle
 
     def register(self, bundle):
-
+        if getattr(self, "_frozen", False):
+            raise FrozenError(f"{clsname(self)} is frozen, bundles can not be registered", location=self)
         if isinstance(bundle, type):
             bundle = bundle()
         try:
@@ -52,17 +77,360 @@ class Compose(object):
             # When Compose is subclassed with a @dataclass decorated Class init is not called so we'll
             # give it a call.
             Compose.__init__(self,bundle)
+            return
+        if self._parent is not None:
+            self._overlay()
+        bundle.subscribe(self)
+        self.invalidate()
 
     def __init__(self, *bundles: ComposeBundle):
-        self._cached_instances = {}
+        self._cached_instances = InstanceCache()
+        self._plans = {}
+        self._frozen = False
         self._bundles = list(bundles)
         self._base_bundle = (self._bundles or [FactoryBundle()]).pop(0)
+        for bundle in chain(self._bundles, [self._base_bundle]):
+            bundle.subscribe(self)
+
+    def invalidate(self):
+        """Drops every recorded `ResolutionPlan`. Bundles call this when their bindings change."""
+        self._plans.clear()
+        if self._children:
+            for child in list(self._children.values()):
+                child.invalidate()
+
+    def bundles(self) -> Iterator[ComposeBundle]:
+        """The bundles searched for bindings in order, those of a child container before its parent's"""
+        compose = self
+        while compose is not None:
+            yield from compose._own_bundles()
+            compose = compose._parent
+
+    def _own_bundles(self) -> List[ComposeBundle]:
+        if self._base_bundle is None:
+            return self._bundles
+        return self._bundles + [self._base_bundle]
+
+    def child(self) -> 'Compose':
+        """A container that starts out with everything this one has, to override a few bindings per request or test::
+
+            request = compose.child()
+            with request.registry():
+                Bind[User].to(lambda: current_user)
+            request.provide(Handler)
+
+        Making one is cheap, nothing is copied. Until bindings are registered with the child it uses this container's
+        `ResolutionPlan`s, afterwards it keeps its own with its bindings ahead of this container's. Singletons and cached
+        instances are shared and are always built by the container they are bound in, the child's bindings are not
+        used for them. Scopes opened with the child only hold what is provided through it. Changes to this
+        container show up in the child. Stats and tracing are taken as they are when the child is made.
+        """
+        child = object.__new__(type(self))
+        child._parent = self
+        child._cached_instances = self._cached_instances
+        child._plans = {}
+        child._frozen = False
+        child._bundles = []
+        child._base_bundle = None
+        child._metrics = self._metrics
+        child._tracer = self._tracer
+        return child
+
+    def _owner(self, bundle) -> 'Compose':
+        """The container `bundle` is registered with, this one or the first parent up the chain that has it"""
+        compose = self
+        while compose._parent is not None and not any(own is bundle for own in compose._own_bundles()):
+            compose = compose._parent
+        return compose
+
+    def _overlay(self):
+        """Gives a child container a bundle of its own the first time it is registered with"""
+        if self._base_bundle is not None:
+            return
+        self._base_bundle = FactoryBundle()
+        self._base_bundle.subscribe(self)
+        # every container above, one in between may not record plans of its own and never be told
+        parent = self._parent
+        while parent is not None:
+            if parent._children is None:
+                parent._children = weakref.WeakValueDictionary()
+            parent._children[id(self)] = self
+            parent = parent._parent
+        self.invalidate()
+
+    def plan(self, kls, context: InstantiationContext) -> ResolutionPlan:
+        """Returns the `ResolutionPlan` for `kls`, recording it the first time `kls` is asked for."""
+        if self._base_bundle is None:
+            # a child without bindings of its own
+            return self._parent.plan(kls, context)
+        metrics = self._metrics
+        try:
+            plan = self._plans[kls]
+            if metrics is not None:
+                metrics.plan_hit()
+            return plan
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable, these can't be recorded
+            return self._plan(kls, context)[0]
+        start = time.perf_counter() if metrics is not None else 0
+        plan, complete = self._plan(kls, context)
+        if complete:
+            self._plans[kls] = plan
+        if metrics is not None:
+            metrics.plan_built(time.perf_counter() - start)
+        return plan
+
+    def _traced_plan(self, kls, context: InstantiationContext) -> ResolutionPlan:
+        tracer = context._tracer
+        if tracer is None:
+            return self.plan(kls, context)
+        span = tracer.begin(type_name(kls), "lookup")
+        try:
+            return self.plan(kls, context)
+        finally:
+            tracer.end(span)
+
+    def _plan(self, kls, context):
+        steps = []
+        check_kls = search_target(kls)[0]
+        for bundle in self._own_bundles():
+            try:
+                candidates = bundle.plan(kls, context)
+            except Exception:
+                # Leave it to the search to raise, if it ever gets to this bundle
+                candidates = None
+            if candidates == []:
+                # nothing to check, the bundle's listener drops the plan if that changes
+                continue
+            steps.append((bundle, check_kls, candidates))
+        if self._parent is not None:
+            # the parent's plan is recorded by the parent and reused by all of its children
+            steps.extend(self._parent.plan(kls, context).steps)
+        return ResolutionPlan(kls, steps), all(candidates is not None for _, _, candidates in steps)
+
+    def candidates(self, kls) -> List['Binding']:
+        """Every binding that could provide `kls` going by type alone, across all bundles. Bundles that can not be
+        planned are left out.
+        """
+        context = InstantiationContext(target=kls, parent=Undefined, compose=self)
+        return [binding for _, _, candidates in self.plan(kls, context).steps for binding in candidates or ()]
+
+    def enable_stats(self, enabled: bool = True, samples: int = 1024):
+        """Starts, or stops, keeping the numbers reported by `stats`. Starting again resets them. While stats are
+        off the only cost is checking whether they are on.
+
+        :param samples: how many build times to keep per binding for the percentiles
+        """
+        self._metrics = Metrics(samples) if enabled else None
+
+    def stats(self) -> Dict[str, object]:
+        """What Compose has been doing since `enable_stats`::
+
+            bindings         per binding: how often it was built (created), handed out as an already built singleton
+                             (singleton_hits) and failed (errors). Total build time with (time) and without
+                             (self_time) building its dependencies, and the mean, p50, p90, p99 and max of the latter.
+                             Slowest first.
+            lookups          how often a `ResolutionPlan` was reused (plan_hits) or worked out (plan_builds) and the
+                             time spent working them out (plan_time)
+            optional_misses  optional requirements nothing provided, by type
+            optional_errors  optional requirements that failed to build and were left out, by type
+
+        Times are in seconds. Returns None when stats are not enabled.
+        """
+        return self._metrics.snapshot() if self._metrics is not None else None
+
+    def enable_tracing(self, tracer: Optional[Tracer]) -> Optional[Tracer]:
+        """Records a span for every lookup, instantiation, factory call and hook of the resolutions `tracer` samples,
+        nested the way they happened. Passing None stops tracing and closes the previous tracer's sinks::
+
+            sink = ChromeTraceSink("provide.json")
+            compose.enable_tracing(Tracer(sink))
+            compose.provide(App)
+            sink.flush()
+
+        :return: the previous tracer
+        """
+        previous, self._tracer = self._tracer, tracer
+        if previous is not None and tracer is None:
+            previous.close()
+        return previous
+
+    def warmup(self, max_workers: int = None) -> Dict['Binding', float]:
+        """Builds every singleton that has not been built yet, so the first requests don't pay for them.
+
+        Which singletons need which is worked out from the factory signatures. They are then built a level at a time,
+        everything in a level only depends on earlier levels and is built in parallel on a thread pool. Singletons
+        bound with a predicate (`Binding.on`) are left alone since they can only be built where they are used, as are
+        those with an asynchronous factory and the singletons that need them, `aprovide` builds those.
+
+        Singletons failing to build do not stop the others. Once every level has been built they are raised together
+        as a `WarmupError`.
+
+        :param max_workers: size of the thread pool, see `ThreadPoolExecutor`
+        :return: seconds taken to build each singleton
+        """
+        singletons = {}
+        for bundle in self.bundles():
+            for binding in bundle.bindings():
+                if binding._as_singleton and not binding.is_singleton and not binding.is_conditional:
+                    singletons.setdefault(binding, bundle)
+
+        depends_on = {binding: self._singleton_dependencies(binding, singletons) for binding in singletons}
+        timings, errors = {}, {}
+        skipped = set()
+        with ThreadPoolExecutor(max_workers) as pool:
+            for level in dependency_levels(depends_on):
+                builds = []
+                for binding in level:
+                    if inspect.iscoroutinefunction(binding.factory) or depends_on[binding] & skipped:
+                        skipped.add(binding)
+                        continue
+                    builds.append((binding, pool.submit(self._build_singleton, binding, singletons[binding])))
+                for binding, build in builds:
+                    try:
+                        timings[binding] = build.result()
+                    except Exception as ex:
+                        logger.debug("Warming up %s failed: %s", binding.bound_to, ex)
+                        errors[binding] = ex
+        if errors:
+            raise WarmupError(f"{len(errors)} singletons failed to build: "
+                              f"{', '.join(clsname(binding.bound_to) for binding in errors)}",
+                              errors, timings, location=[binding.factory for binding in errors])
+        return timings
+
+    def _singleton_dependencies(self, singleton, singletons):
+        """The singletons `singleton` needs, directly or through bindings that are not singletons"""
+        found = set()
+        seen = {singleton}
+        pending = [singleton]
+        while pending:
+            try:
+                requirements = list(binding_requirements(pending.pop()))
+            except ComposeError:
+                # a broken binding is reported when something asks for it, not here
+                continue
+            for kls in requirements:
+                for binding in self.candidates(kls):
+                    if binding in seen:
+                        continue
+                    seen.add(binding)
+                    if binding in singletons:
+                        found.add(binding)
+                    elif not binding.is_singleton:
+                        pending.append(binding)
+        return found
+
+    def _build_singleton(self, binding, bundle):
+        context = InstantiationContext(target=binding.bound_to, parent=Undefined, compose=self)
+        context.provider = binding
+        context.provider_bundle = bundle
+        start = time.perf_counter()
+        context.instance
+        return time.perf_counter() - start
+
+    def validate(self) -> Dict[object, Exception]:
+        """Checks every bound type can be built without building anything. Factory and hook signatures are followed
+        through all bundles the way `provide` would, predicates included.
+
+        :return: the bound types that can not be provided along with the reason, `RequirementNotFound`,
+            `TooManyProviders` or `CircularDependency` usually. Empty when the configuration is sound.
+        """
+        return validate(self)
+
+    def freeze(self) -> FrozenCompose:
+        """Compiles every bound type into a function that calls the factories directly and returns them as a
+        `FrozenCompose`. Predicates, generic templates and hooks are all worked out here instead of on every `provide`.
+        Bindings can not be changed afterwards, on this container or in the returned one.
+
+        The result can be written out with `FrozenCompose.write_module` and loaded again without going through the
+        bindings at all. Asynchronous factories and hooks set on instances rather than classes are not supported.
+        """
+        frozen = freeze(self)
+        self._frozen = True
+        for bundle in self._own_bundles():
+            bundle.freeze()
+        return frozen
+
+    def scope(self, name: str = None) -> Scope:
+        """Opens a scope for bindings made with `Binding.as_scoped`. Use it as a context manager, scoped instances
+        are reused until it exits and are then disposed of::
+
+            with compose.scope():
+                compose.provide(Session)
+        """
+        return Scope(self, name)
+
+    @contextmanager
+    def checkout(self, kls, blocking: bool = None, timeout: float = None):
+        """Checks out an instance of a pooled binding (see `Binding.as_pooled`) and puts it back in the pool on
+        exit, without needing a scope::
+
+            with compose.checkout(Parser) as parser:
+                parser.parse(text)
+
+        :param blocking: wait for an instance when the pool is exhausted, defaults to what the binding says
+        :param timeout: how long to wait in seconds, defaults to what the binding says
+        """
+        context = InstantiationContext(target=kls, parent=Undefined, compose=self)
+        found = []
+        for bundle, providers in self._traced_plan(kls, context).providers(context):
+            found = [(bundle, provider) for provider in providers]
+            if found:
+                break
+        bundle, binding = self._only(kls, found, context)
+        if not binding._as_pooled:
+            raise ComposeError(f"{clsname(kls)} is not pooled and can not be checked out, see `Binding.as_pooled`",
+                               location=binding.factory)
+        context.provider = binding
+        context.provider_bundle = bundle
+        pool = binding.get_pool()
+        obj = pool.acquire(context.create, blocking, timeout)
+        try:
+            yield obj
+        finally:
+            pool.release(obj)
+
+    def clear_cache(self, kls=None):
+        """Drops the instances kept for bindings made with `Binding.as_cached` and `Binding.as_weak_singleton`, only
+        those bound to `kls` when given
+        """
+        if kls is None:
+            self._cached_instances.clear()
+            return
+        for bundle in self.bundles():
+            for binding in bundle.bindings():
+                if binding.bound_to is kls:
+                    self._cached_instances.clear(binding)
+
+    def cache_sizes(self) -> Dict[str, int]:
+        """How many instances are cached per bound type, see `InstanceCache.sizes`"""
+        return self._cached_instances.sizes()
+
+    def pool_stats(self) -> Dict[str, Dict[str, object]]:
+        """`Pool.stats` of every pooled binding that has been used, by bound type"""
+        stats = {}
+        for bundle in self.bundles():
+            for binding in bundle.bindings():
+                if binding._as_pooled and binding.pool is not None:
+                    stats.setdefault(type_name(binding.bound_to), binding.pool.stats())
+        return stats
 
     i_T = TypeVar("i_T")
 
     def provide(self, kls: Type[i_T]) -> i_T:
         context = InstantiationContext(target=kls, parent=Undefined, compose=self)
-        instances = list(self.provide_all(kls, context))
+        return self._only(kls, list(self.provide_all(kls, context)), context)
+
+    async def aprovide(self, kls: Type[i_T]) -> i_T:
+        """`provide` for asyncio code. Factories and `requires`/`accepts` hooks may be coroutine functions and the
+        arguments of each factory are built concurrently.
+        """
+        context = InstantiationContext(target=kls, parent=Undefined, compose=self)
+        return self._only(kls, await self.aprovide_all(kls, context), context)
+
+    def _only(self, kls, instances, context):
         if len(instances) > 1:
             raise TooManyProviders(f"{clsname(self)} found multiple bindings for {kls}", instances, context,
                                    location=self._bundles)
@@ -73,19 +441,37 @@ class Compose(object):
             return instances[0]
 
     def provide_all(self, kls, context: InstantiationContext = Undefined):
-
-        # instance = self._cached_instances.locate(kls)
-        # if instance:
-        # return instance
         if context is Undefined:
             context = InstantiationContext(target=kls, parent=context, compose=self)
         provided = False
         context.provider = None
-        for bundle in chain(self._bundles, [self._base_bundle]):
-            for provider in bundle.find(kls, context=context):
+        for bundle, providers in self._traced_plan(kls, context).providers(context):
+            for provider in providers:
                 context.provider = provider
                 context.provider_bundle = bundle
                 provided = True
                 yield context.instance
             if provided:
                 break
+
+    async def aprovide_all(self, kls, context: InstantiationContext = Undefined) -> list:
+        """`provide_all` for `aprovide`. Returns a list, when there are several providers they are built concurrently
+        each with its own context.
+        """
+        if context is Undefined:
+            context = InstantiationContext(target=kls, parent=context, compose=self)
+        context.provider = None
+        for bundle, providers in self._traced_plan(kls, context).providers(context):
+            providers = list(providers)
+            if not providers:
+                continue
+            contexts = [context]
+            if len(providers) > 1:
+                contexts = [InstantiationContext(target=kls, parent=context.parent, compose=self,
+                                                 _lazy=context._lazy) for _ in providers]
+            for provider_context, provider in zip(contexts, providers):
+                provider_context._in_flight = set(context._in_flight)
+                provider_context.provider = provider
+                provider_context.provider_bundle = bundle
+            return list(await asyncio.gather(*(provider_context.ainstance() for provider_context in contexts)))
+        return []
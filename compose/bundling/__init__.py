@@ -1,33 +1,94 @@
 import inspect
 import sys
+import threading
+import weakref
 from contextlib import contextmanager
+from itertools import count
 from importlib._bootstrap import ModuleSpec
 from pkgutil import ModuleInfo, walk_packages
-from typing import Generator, List, Text, cast
+from typing import Any, Dict, Generator, Iterable, List, Mapping, Optional, Text, Tuple, Union, cast
 
-from ._key import bundle_key
+from ._key import registering
 from .binding import Binding, Bind
+from .discovery import scan_classes, scan_package
+from .manifest import DiscoveryManifest, file_stamp
+from .spec import bindings_from_spec, load_spec
 from ..extras import Undefined, is_generic_type, get_origin, get_parameters, resolve_type, get_bound, clsname
+from ..exceptions import FrozenError
+from ..extras.generics import memoized
 from ..extras.logging import logger
-from ..util import is_resolvable
+from ..util import is_resolvable, load_object
 
 
 class ComposeBundle(object):
     def __init__(self):
         self._bundles = []
+        # by id so unhashable listeners, like @dataclass subclasses of Compose, can subscribe too
+        self._listeners = weakref.WeakValueDictionary()
+        self._frozen = False
         self._context_factories()
 
     def _context_factories(self):
-        for k, v in inspect.getmembers(self.__class__, lambda a: isinstance(a, FactoryBundle)):
+        # what inspect.getmembers would find, without its cost on every bundle made
+        found = {}
+        for kls in reversed(self.__class__.__mro__):
+            if kls.__module__ in (__name__, "builtins"):
+                # the bundles defined here don't have any
+                continue
+            for k, v in vars(kls).items():
+                if isinstance(v, FactoryBundle):
+                    found[k] = v
+                else:
+                    found.pop(k, None)
+        for k in sorted(found):
             delattr(self.__class__, k)
-            self.extend(v)
+            self.extend(found[k])
 
     def extend(self, bundle):
+        self._ensure_mutable()
         self._bundles.append(bundle)
+        bundle.subscribe(self)
+        self.invalidate()
+
+    def subscribe(self, listener):
+        """`listener.invalidate()` is called whenever the bindings of this bundle, or a bundle it extends, change.
+        Listeners are held weakly.
+        """
+        self._listeners[id(listener)] = listener
+
+    def freeze(self):
+        """Stops bindings being added to or removed from this bundle, the bundles it extends and the bindings
+        themselves. See `Compose.freeze`.
+        """
+        self._frozen = True
+        for binding in self.bindings():
+            binding.freeze()
+        for ext in self._bundles:
+            ext.freeze()
+
+    def _ensure_mutable(self):
+        if self._frozen:
+            raise FrozenError(f"{clsname(self)} is frozen, bindings can not be changed", location=self)
+
+    def invalidate(self):
+        for listener in list(self._listeners.values()):
+            listener.invalidate()
 
     def search(self, kls, context: 'InstantiationContext') -> Generator['Binding', None, None]:
         raise NotImplementedError("Bundles at a minimum must support find")
 
+    def bindings(self) -> Generator['Binding', None, None]:
+        """Every binding of this bundle and the bundles it extends, as far as the bundle knows them"""
+        for ext in self._bundles:
+            yield from ext.bindings()
+
+    def plan(self, kls, context) -> Optional[List['Binding']]:
+        """Returns every binding of this bundle and its extensions that could provide `kls` ignoring any predicates,
+        in the order `find` would yield them. Bundles that can only answer with `search` return None and will be
+        searched on every request.
+        """
+        return None
+
     def find(self, kls, context) -> Generator['Binding', None, None]:
         yield from self.search(kls, context)
         # This could be dangerous if bundles have circular references probably need to add some logic to prevent
@@ -46,50 +107,137 @@ class ComposeBundle(object):
          automatically add the binding to the Bundle passed into the context.
         :return:
         """
-
-        stack = inspect.stack()
-        stack[2].frame.f_locals[bundle_key] = self
-        yield self
-        del stack[2].frame.f_locals[bundle_key]
+        with registering(self):
+            yield self
 
 
 class FactoryBundle(ComposeBundle):
     def __init__(self):
         super().__init__()
+        # oldest first, `bindings` gives them newest first
         self._factories: List[Binding] = []
+        # Bindings for plain classes are indexed by the class they are bound for. A type can only be a subclass of
+        # those classes in its __mro__ so only those buckets need to be checked. Everything else (ABCs and other
+        # classes with a custom __subclasscheck__, typing constructs) has to be asked every time.
+        self._index: Dict[Any, List[Tuple[int, Binding]]] = {}
+        self._unindexed: List[Tuple[int, Binding]] = []
+        self._sequence = count()
 
     def add_binding(self, bind: Bind = Undefined):
-        self._factories.insert(0, bind)
+        self._ensure_mutable()
+        self._factories.append(bind)
+        self._bucket(bind).append((next(self._sequence), bind))
+        self.invalidate()
+
+    def add_bindings(self, bindings: Iterable[Binding]):
+        """`add_binding` for a batch, later bindings take precedence like they would added one at a time. Listeners
+        are only told once.
+        """
+        self._ensure_mutable()
+        for bind in bindings:
+            self._factories.append(bind)
+            self._bucket(bind).append((next(self._sequence), bind))
+        self.invalidate()
+
+    def add_spec(self, spec: Union[Mapping, Text]):
+        """Adds the bindings described by `spec`, a dict or the path of a JSON file. See `bindings_from_spec`."""
+        self.add_bindings(bindings_from_spec(load_spec(spec) if isinstance(spec, str) else spec))
+
+    @classmethod
+    def from_spec(cls, spec: Union[Mapping, Text]) -> 'FactoryBundle':
+        bundle = cls()
+        bundle.add_spec(spec)
+        return bundle
 
     def remove_binding(self, bind: Bind = Undefined):
+        self._ensure_mutable()
         try:
             idx = self._factories.index(bind)
         except ValueError:
             return None
-        return self._factories.pop(idx)
+        binding = self._factories.pop(idx)
+        bucket = self._bucket(binding)
+        for idx in range(len(bucket) - 1, -1, -1):
+            if bucket[idx][1] is binding:
+                del bucket[idx]
+                break
+        self.invalidate()
+        return binding
+
+    def _bucket(self, binding: Binding) -> List[Tuple[int, Binding]]:
+        bound = binding.bound_to
+        if isinstance(bound, type) and type(bound).__subclasscheck__ is type.__subclasscheck__:
+            return self._index.setdefault(bound, [])
+        return self._unindexed
+
+    def _lookup(self, kls) -> List[Binding]:
+        """The bindings that may provide `kls`, newest first like `bindings`."""
+        entries = list(self._unindexed)
+        if isinstance(kls, type):
+            keys = kls.__mro__
+        else:
+            keys = (kls,)
+        for key in keys:
+            try:
+                entries.extend(self._index.get(key, ()))
+            except TypeError:
+                # unhashable, nothing could have been bound to it
+                pass
+        if len(entries) > 1:
+            entries.sort(reverse=True, key=lambda entry: entry[0])
+        return [binding for _, binding in entries]
+
+    def bindings(self):
+        yield from reversed(self._factories)
+        yield from super().bindings()
+
+    def plan(self, kls, context):
+        if type(self).search is not FactoryBundle.search or type(self).find is not ComposeBundle.find:
+            # a subclass answering in its own way has to be asked every time
+            return None
+        candidates = list(self._candidates(*search_target(kls), context))
+        for ext in self._bundles:
+            extension_candidates = ext.plan(kls, context)
+            if extension_candidates is None:
+                return None
+            candidates.extend(extension_candidates)
+        return candidates
 
     def search(self, kls, context):
-        resolve_templates = None
-        if is_generic_type(kls) and get_origin(kls) is not type:
-            resolve_templates = get_parameters(get_origin(kls))
-            resolve_templates = list((t, resolve_type(kls, t) or get_bound(t)) for t in resolve_templates)
-            kls = get_origin(kls)
+        kls, resolve_templates = search_target(kls)
+        for factory in self._candidates(kls, resolve_templates, context, check=True):
+            yield factory
 
-        for factory in self._factories:
+    def _candidates(self, kls, resolve_templates, context, check=False):
+        for factory in self._lookup(kls):
             try:
-                if factory.provides(kls, templates=resolve_templates, context=context):
+                if factory.matches(kls, templates=resolve_templates, context=context) and \
+                        (not check or factory.check(kls, context)):
                     yield factory
             except TypeError as ex:
                 # We could check in the search for is_resolvable but since a FactoryBundle could
                 # implement something to make an item Compose thinks is unresolvable resolvable we ask the
                 # factories and just hide any errors if compose thinks it is unresolvable
                 if is_resolvable(kls):
-                    logger.error("Factory can not respond to it's ability to provide {kls}. Error follows, "
-                                 "but compose Moving on to the next factory.")
+                    logger.error("Factory can not respond to it's ability to provide %s. Error follows, "
+                                 "but compose Moving on to the next factory.", kls)
                     logger.exception(ex)
                 else:
-                    logger.debug(f"Factory choked on unresolvable type '{kls}', generally this is ignorable "
-                                 f"since {kls} is considered unresolvable. Here was the error: {ex}")
+                    logger.debug("Factory choked on unresolvable type '%s', generally this is ignorable "
+                                 "since %s is considered unresolvable. Here was the error: %s", kls, kls, ex)
+
+
+@memoized()
+def search_target(kls):
+    """Splits a parameterized generic into its origin and the types its templates resolve to. The answer is worked
+    out once per alias.
+    """
+    resolve_templates = None
+    if is_generic_type(kls) and get_origin(kls) is not type:
+        resolve_templates = get_parameters(get_origin(kls))
+        resolve_templates = tuple((t, resolve_type(kls, t) or get_bound(t)) for t in resolve_templates)
+        kls = get_origin(kls)
+    return kls, resolve_templates
 
 
 class AutoBundle(FactoryBundle):
@@ -103,8 +251,20 @@ class AutoBundle(FactoryBundle):
                 pass
         return None
 
-    def __init__(self, paths=None, add_main=False):
+    def __init__(self, paths=None, add_main=False, manifest: Text = None, lazy: bool = False):
+        """
+        :param paths: package or module spec to discover classes in
+        :param add_main: also bind the classes of __main__
+        :param manifest: file to remember what was discovered in, see `DiscoveryManifest`. Modules that did not
+            change since are not inspected again.
+        :param lazy: find classes by reading the source of each module instead of importing it, see `scan`
+        """
         super().__init__()
+        self._manifest = DiscoveryManifest(manifest) if manifest else None
+        self._lazy = lazy
+        # Classes found by `scan` that have not been asked for yet, by module and qualified name
+        self._pending: Dict[Text, int] = {}
+        self._pending_lock = threading.Lock()
         if paths:
             self.discover(paths)
         if add_main:
@@ -116,26 +276,87 @@ class AutoBundle(FactoryBundle):
             self.add_binding(Bind(kls).add(kls))
 
     def discover(self, spec, package_name: Text = None):
-        modules = []
         if hasattr(spec, "__spec__"):
             spec = spec.__spec__
 
-        if isinstance(spec, ModuleSpec):
-            modules = self.crawl(spec)
-
-        for module in modules:
+        if not isinstance(spec, ModuleSpec):
+            return
+        if self._lazy:
+            self.scan(spec)
+            return
+        for info in self.walk(spec):
+            if self._manifest is not None and self._add_recorded(info.name):
+                continue
+            module = self.module_info_to_module(info)
             if module is None:
                 continue
             self.inspect_module(module)
+        if self._manifest is not None:
+            self._manifest.save()
 
-    def crawl(self, spec: ModuleSpec):
+    def scan(self, spec: ModuleSpec):
+        """Discovery without imports. The source of each module is parsed for the classes it defines and those are
+        bound once the class is first asked for, by which point whoever asked has imported it. Modules without
+        source are imported and inspected as usual.
+
+        Unlike `inspect_module` only the classes a module defines itself are found, not those of modules it imports.
+        """
+        self._ensure_mutable()
+        for info, path in scan_package(spec):
+            if path is None:
+                module = self.module_info_to_module(info)
+                if module is not None:
+                    self.inspect_module(module)
+                continue
+            key = f"source:{info.name}"
+            recorded = self._manifest.lookup(key) if self._manifest is not None else None
+            if recorded is None:
+                try:
+                    recorded = [(info.name, qualname) for qualname in scan_classes(path)]
+                except (OSError, SyntaxError, ValueError) as ex:
+                    logger.debug("Can not read %s....skipping", path, exc_info=ex)
+                    continue
+                if self._manifest is not None:
+                    self._manifest.record(key, {path: file_stamp(path)}, recorded)
+            with self._pending_lock:
+                for module, qualname in recorded:
+                    self._pending[f"{module}.{qualname}"] = next(self._sequence)
+        if self._manifest is not None:
+            self._manifest.save()
+        self.invalidate()
+
+    def _lookup(self, kls):
+        if self._pending and isinstance(kls, type):
+            self._bind_pending(kls)
+        return super()._lookup(kls)
+
+    def _bind_pending(self, kls):
+        """Binds the scanned classes `kls` is a subclass of. Those are the only ones a binding to itself can provide
+        `kls` from, so nothing else has to be imported.
+        """
+        with self._pending_lock:
+            for base in kls.__mro__:
+                sequence = self._pending.pop(f"{base.__module__}.{base.__qualname__}", None)
+                if sequence is None or getattr(base, f"_{clsname(base)}_compose_abstract", False):
+                    continue
+                binding = Binding(base).to_self()
+                if self._frozen:
+                    binding.freeze()
+                # keeps the place it was scanned in, newer bindings still come first
+                self._factories.append(binding)
+                self._bucket(binding).append((sequence, binding))
+
+    def walk(self, spec: ModuleSpec):
         try:
             package_path = spec.submodule_search_locations
         except AttributeError:
             spec = cast(ModuleInfo, spec)
             package_path = [spec.module_finder.path]
         package_name = spec.name
-        for m in walk_packages(package_path, package_name + ".", onerror=lambda e: ""):
+        yield from walk_packages(package_path, package_name + ".", onerror=lambda e: "")
+
+    def crawl(self, spec: ModuleSpec):
+        for m in self.walk(spec):
             yield self.module_info_to_module(m)
 
     def module_info_to_module(self, m):
@@ -147,21 +368,59 @@ class AutoBundle(FactoryBundle):
             try:
                 module = loader[0].load_module(name)
             except Exception as ex:
-                logger.debug(f"Import error....skipping {name}", exc_info=ex)
+                logger.debug("Import error....skipping %s", name, exc_info=ex)
                 return
         return module
 
+    def _add_recorded(self, name) -> bool:
+        """Binds the classes the manifest has for module `name`, False if it has to be inspected instead"""
+        recorded = self._manifest.lookup(name)
+        if recorded is None:
+            return False
+        try:
+            classes = [load_object(module, qualname) for module, qualname in recorded]
+        except Exception as ex:
+            logger.debug("Discovery manifest entry for %s is stale, inspecting it again", name, exc_info=ex)
+            self._manifest.forget(name)
+            return False
+        for member in classes:
+            self.add_binding(Binding(member).to_self())
+        return True
+
     def inspect_module(self, module):
+        files = {}
+        classes = list(self.module_classes(module, files))
+        if self._manifest is not None:
+            if all(is_importable(kls) for kls in classes):
+                self._manifest.record(module.__name__, files, [(kls.__module__, kls.__qualname__) for kls in classes])
+            else:
+                self._manifest.forget(module.__name__)
+        for member in classes:
+            self.add_binding(Binding(member).to_self())
+
+    def module_classes(self, module, files: Dict[Text, List[int]] = None):
+        """The classes discovery binds for `module` and the modules it imports. The stamp of each module file looked
+        at is added to `files`.
+        """
         name = module.__name__
         if name == "context.py":
             return
+        path = getattr(module, "__file__", None)
+        if files is not None and path:
+            files[path] = file_stamp(path)
         for n, member in inspect.getmembers(module):
             if n in ("job_context", "logger", "logging", "os", "sys"):
                 continue
             if inspect.ismodule(member):
-                self.inspect_module(member)
+                yield from self.module_classes(member, files)
                 continue
             if isinstance(member, type):
                 if member.__module__ == name:
                     if not getattr(member, f"_{clsname(member)}_compose_abstract", False):
-                        self.add_binding(Binding(member).to_self())
+                        yield member
+
+
+def is_importable(kls) -> bool:
+    """True when `kls` can be found again by its module and qualified name"""
+    qualname = getattr(kls, "__qualname__", "")
+    return "<" not in qualname and getattr(kls, "__module__", "__main__") != "__main__"
@@ -1,3 +1,23 @@
 import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
 
-bundle_key = "_binding_context_" + str(uuid.uuid4())
\ No newline at end of file
+bundle_key = "_binding_context_" + str(uuid.uuid4())
+
+# The bundle `Bind[...]` adds to, set by the innermost `registry()` of the current thread or task
+_registry: ContextVar[Optional['ComposeBundle']] = ContextVar("compose_registry", default=None)
+
+
+def current_registry() -> Optional['ComposeBundle']:
+    return _registry.get()
+
+
+@contextmanager
+def registering(bundle: 'ComposeBundle'):
+    """Makes `bundle` the one `Bind[...]` adds to until the block exits, the previous one is restored after"""
+    token = _registry.set(bundle)
+    try:
+        yield bundle
+    finally:
+        _registry.reset(token)
@@ -1,14 +1,17 @@
 import inspect
+import sys
+import threading
 import weakref
 from functools import partial
 from typing import Callable, Generic, TypeVar
 
-from ._key import bundle_key
-from ..exceptions import RequirementNotFound, AmbiguousDependency
+from ._key import bundle_key, current_registry
+from ..exceptions import RequirementNotFound, AmbiguousDependency, FrozenError
 from ..extras import clsname
 from ..extras.generics import is_generic_type, get_origin, resolve_type
 from ..extras.logging import logger
 from ..extras.undef import Undefined, default
+from ..pooling import Pool
 
 
 class _RebindContext(object):
@@ -26,12 +29,16 @@ class _RebindContext(object):
 class BindMeta(type):
 
     def __getitem__(cls, item) -> 'Binding':
-        c_local = cls.caller_local()
-        bundle = c_local.get(bundle_key, Undefined)
-        if bundle is Undefined:
-            from compose import FactoryBundle
-            c_local[bundle_key] = FactoryBundle()
-            bundle = c_local[bundle_key]
+        bundle = current_registry()
+        if bundle is None:
+            # Outside of a registry, for instance in the body of a bundle class, the binding goes to a bundle kept
+            # in the caller's locals
+            c_local = cls.caller_local()
+            bundle = c_local.get(bundle_key, Undefined)
+            if bundle is Undefined:
+                from compose import FactoryBundle
+                c_local[bundle_key] = FactoryBundle()
+                bundle = c_local[bundle_key]
         binding = None
         if cls == ReBind:
             binding = list(bundle.find(item, _RebindContext(bundle)))
@@ -48,10 +55,11 @@ class BindMeta(type):
         return binding
 
     def caller_local(cls):
-        stack = inspect.stack()
-        for frame_info in stack:
-            if frame_info.frame.f_locals.get("cls", None) != cls:
-                return frame_info.frame.f_locals
+        frame = sys._getframe(1)
+        while frame is not None:
+            if frame.f_locals.get("cls", None) != cls:
+                return frame.f_locals
+            frame = frame.f_back
         return {}
 
 
@@ -82,13 +90,40 @@ class Binding(Generic[T]):
 
     def __init__(self, bind: T):
         self.is_singleton = False
+        self.singleton = None
+        # Held while the singleton is built so it is only built once. Reentrant so a singleton that ends up
+        # depending on itself fails like any other circular dependency instead of deadlocking.
+        self.lock = threading.RLock()
+        # The build of the singleton when it is being built by `Compose.aprovide`
+        self._pending = None
         self._as_singleton = False
+        self._as_scoped = False
+        self._scope_name = None
+        self._dispose = None
+        self._as_cached = False
+        self._cache_options = None
+        self._as_weak_singleton = False
+        self._as_pooled = False
+        self._pool_options = None
+        # The `Pool` of a pooled binding, made the first time it is used
+        self.pool = None
         self._config_for = bind
         self._factory = None
         self._additional_check = lambda *a: True
+        self._conditional = False
+        self._frozen = False
         self.provide_type = None
 
+    def freeze(self):
+        """Stops the binding from being reconfigured, see `Compose.freeze`"""
+        self._frozen = True
+
+    def _ensure_mutable(self):
+        if self._frozen:
+            raise FrozenError(f"The binding for {self._config_for} is frozen and can not be changed")
+
     def to_multiple(self, *factories):
+        self._ensure_mutable()
         for factory in factories:
             self._bundle.add_binding(Binding(self._config_for).to(factory))
         self._bundle.remove_binding(self)
@@ -96,6 +131,7 @@ class Binding(Generic[T]):
         return None
 
     def to(self, factory: Callable):
+        self._ensure_mutable()
         if isinstance(factory, list):
             raise ValueError("Each factory binding must be its own binding, use to_multiple for an easier syntax")
         if not callable(factory) and not isinstance(factory, str):
@@ -122,6 +158,8 @@ class Binding(Generic[T]):
         return check
 
     def on(self, predicate) -> 'Binding':
+        self._ensure_mutable()
+        self._conditional = True
         self._additional_check = predicate
         if isinstance(predicate, type):
             self._additional_check = self.on_target(predicate)
@@ -131,14 +169,76 @@ class Binding(Generic[T]):
         return self.to(self._config_for)
 
     def as_singleton(self):
+        self._ensure_mutable()
         self._as_singleton = True
         return self
 
+    def as_cached(self, maxsize: int = 128, ttl: float = None):
+        """Reuses instances like a singleton but only keeps so many for so long, one per type asked for so
+        every specialization of a generic binding is cached on its own.
+
+        :param maxsize: most instances kept, the least recently used is dropped first. No limit when None
+        :param ttl: seconds an instance is reused for before a new one is built, forever when None
+        """
+        self._ensure_mutable()
+        self._as_cached = True
+        self._cache_options = (maxsize, ttl)
+        return self
+
+    def as_weak_singleton(self):
+        """Reuses the instance for as long as something else holds on to it, once it is collected the next one asked
+        for is built again. Instances that can not be referenced weakly are not reused at all.
+        """
+        self._ensure_mutable()
+        self._as_weak_singleton = True
+        return self
+
+    def as_scoped(self, name: str = None, dispose: Callable = None):
+        """One instance per open `Compose.scope()`, for things like database sessions that live as long as a request.
+
+        :param name: only cache in scopes opened with this name, the innermost scope is used otherwise
+        :param dispose: called with the instance when its scope closes
+        """
+        self._ensure_mutable()
+        self._as_scoped = True
+        self._scope_name = name
+        self._dispose = dispose
+        return self
+
+    def as_pooled(self, min: int = 0, max: int = None, validate: Callable = None, dispose: Callable = None,
+                  blocking: bool = True, timeout: float = None):
+        """Keeps instances in a pool to be reused, for things that are expensive to make but can't be shared like
+        parsers or connections. An instance is checked out for as long as the open `Compose.scope()` it was provided
+        in, or with `Compose.checkout`, and then goes back to the pool.
+
+        :param min: instances built the first time the pool is used
+        :param max: most instances there can be at once, no limit when None
+        :param validate: called with an instance as it comes back, a false result drops it from the pool
+        :param dispose: called with instances dropped from the pool
+        :param blocking: wait for an instance to come back when there are `max` already, instead of raising
+            `PoolExhausted`
+        :param timeout: how long to wait in seconds, forever when None
+        """
+        self._ensure_mutable()
+        self._as_pooled = True
+        self._pool_options = dict(minimum=min, maximum=max, validate=validate, dispose=dispose, blocking=blocking,
+                                  timeout=timeout)
+        return self
+
+    def get_pool(self) -> 'Pool':
+        """The pool of a binding made with `as_pooled`"""
+        if self.pool is None:
+            with self.lock:
+                if self.pool is None:
+                    self.pool = Pool(clsname(self._config_for), **self._pool_options)
+        return self.pool
+
     def accept(self, bundle: 'ComposeBundle'):
         self._bundle = weakref.proxy(bundle)
         bundle.add_binding(self)
 
     def with_args(self, *args, **kwargs):
+        self._ensure_mutable()
         self._factory = partial(self._factory, *args, **kwargs)
         return self
 
@@ -152,7 +252,10 @@ class Binding(Generic[T]):
         else:
             return self._factory
 
-    def provides(self, kls, templates=None, context=Undefined):
+    def matches(self, kls, templates=None, context=Undefined):
+        """The type half of `provides`. The answer only depends on `kls` and `templates` so it can be recorded in a
+        `ResolutionPlan`, the predicate half (`check`) can not.
+        """
         provides = False
         if is_generic_type(kls) and get_origin(kls) is type:
             if self._config_for == kls:
@@ -169,12 +272,22 @@ class Binding(Generic[T]):
                           f"example my_prop:Mapping = field(default=None). Compose can not resolve Mapping, mapping of what?"
                     raise AmbiguousDependency(msg, context)
                 raise ex
-        if provides:
-            if isinstance(self.provide_type, str):
-                self.provide_type = self.factory
-            return self._additional_check(kls, default(context.parent, context))
-        return False
+        if provides and isinstance(self.provide_type, str):
+            self.provide_type = self.factory
+        return provides
+
+    def check(self, kls, context=Undefined):
+        """Runs the predicate set with `on` against the instantiation chain"""
+        return self._additional_check(kls, default(context.parent, context))
+
+    def provides(self, kls, templates=None, context=Undefined):
+        return self.matches(kls, templates=templates, context=context) and self.check(kls, context)
 
     @property
     def bound_to(self):
         return self._config_for
+
+    @property
+    def is_conditional(self):
+        """True when `on` has been used, whether the binding provides then depends on the instantiation chain"""
+        return self._conditional
@@ -0,0 +1,62 @@
+import ast
+from importlib.machinery import ModuleSpec
+from pkgutil import ModuleInfo, iter_modules
+from typing import Generator, List, Optional, Text, Tuple
+
+from ..extras.logging import logger
+
+__all__ = [
+    'scan_package',
+    'scan_classes'
+]
+
+
+def scan_package(spec: ModuleSpec) -> Generator[Tuple[ModuleInfo, Optional[Text]], None, None]:
+    """`walk_packages` without the imports. Yields every module and package under `spec` along with its source file,
+    None for modules without Python source.
+    """
+    yield from _scan(spec.submodule_search_locations or [], spec.name + ".")
+
+
+def _scan(paths, prefix):
+    for info in iter_modules(paths, prefix):
+        try:
+            spec = info.module_finder.find_spec(info.name)
+        except Exception as ex:
+            logger.debug("Can not locate %s....skipping", info.name, exc_info=ex)
+            continue
+        if spec is None:
+            continue
+        origin = spec.origin if spec.origin and spec.origin.endswith(".py") else None
+        yield info, origin
+        if info.ispkg and spec.submodule_search_locations:
+            yield from _scan(spec.submodule_search_locations, info.name + ".")
+
+
+def scan_classes(path: Text) -> List[Text]:
+    """The names of the classes a module defines at module level, read from its source. Classes marked with
+    `compose.modifiers.ignore` are left out.
+    """
+    with open(path, "rb") as source:
+        tree = ast.parse(source.read(), path)
+    return [node.name for node in _module_level(tree.body)
+            if isinstance(node, ast.ClassDef) and not any(_is_ignore(d) for d in node.decorator_list)]
+
+
+def _module_level(body):
+    # Classes defined under an if, try or with at module level still end up in the module
+    for node in body:
+        yield node
+        if isinstance(node, (ast.If, ast.Try, ast.With)):
+            for block in ("body", "orelse", "finalbody"):
+                yield from _module_level(getattr(node, block, ()))
+            for handler in getattr(node, "handlers", ()):
+                yield from _module_level(handler.body)
+
+
+def _is_ignore(decorator) -> bool:
+    if isinstance(decorator, ast.Name):
+        return decorator.id == "ignore"
+    if isinstance(decorator, ast.Attribute):
+        return decorator.attr == "ignore"
+    return False
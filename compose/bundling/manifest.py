@@ -0,0 +1,78 @@
+import json
+import os
+from typing import Dict, List, Optional, Text, Tuple
+
+from ..extras.logging import logger
+
+__all__ = [
+    'DiscoveryManifest',
+    'file_stamp'
+]
+
+
+def file_stamp(path: Text) -> Optional[List[int]]:
+    """What a file's modification time and size were, None if it is gone"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class DiscoveryManifest(object):
+    """Remembers which classes `AutoBundle` found in each module so unchanged modules don't have to be inspected
+    again. Each module is stored with the stamps (see `file_stamp`) of the files its classes came from, a module is
+    only trusted while none of them have changed. Saved as JSON.
+    """
+    VERSION = 1
+
+    def __init__(self, path: Text):
+        self.path = path
+        self._modules: Dict[Text, dict] = self._load()
+        self._changed = False
+
+    def _load(self) -> Dict[Text, dict]:
+        try:
+            with open(self.path) as manifest:
+                data = json.load(manifest)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as ex:
+            logger.warning("Ignoring unreadable discovery manifest %s: %s", self.path, ex)
+            return {}
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return {}
+        return data.get("modules", {})
+
+    def lookup(self, module: Text) -> Optional[List[Tuple[Text, Text]]]:
+        """The (module, qualname) of each class found in `module` last time, None if it has to be inspected again"""
+        entry = self._modules.get(module)
+        if entry is None:
+            return None
+        for path, stamp in entry["files"].items():
+            if file_stamp(path) != stamp:
+                return None
+        return [tuple(kls) for kls in entry["classes"]]
+
+    def record(self, module: Text, files: Dict[Text, List[int]], classes: List[Tuple[Text, Text]]):
+        self._modules[module] = {"files": files, "classes": [list(kls) for kls in classes]}
+        self._changed = True
+
+    def forget(self, module: Text):
+        if self._modules.pop(module, None) is not None:
+            self._changed = True
+
+    def save(self):
+        """Writes the manifest if anything changed. The file is replaced in one go so readers never see half of it."""
+        if not self._changed:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temporary = os.path.join(directory, f".{os.path.basename(self.path)}.{os.getpid()}.tmp")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(temporary, "w") as manifest:
+                json.dump({"version": self.VERSION, "modules": self._modules}, manifest)
+            os.replace(temporary, self.path)
+            self._changed = False
+        except OSError as ex:
+            logger.warning("Could not save discovery manifest %s: %s", self.path, ex)
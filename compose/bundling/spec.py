@@ -0,0 +1,131 @@
+import importlib
+import json
+from typing import Any, Dict, List, Mapping, Text
+
+from .binding import Binding
+from ..exceptions import SpecError
+
+__all__ = [
+    'bindings_from_spec',
+    'load_spec'
+]
+
+LIFETIMES = ("transient", "singleton", "weak_singleton", "cached", "scoped", "pooled")
+
+
+def load_spec(path: Text) -> Mapping:
+    """Reads a binding spec from a JSON file"""
+    try:
+        with open(path) as spec:
+            return json.load(spec)
+    except (OSError, ValueError) as ex:
+        raise SpecError(f"Can not read binding spec {path}: {ex}") from ex
+
+
+def bindings_from_spec(spec: Mapping) -> List[Binding]:
+    """Builds bindings from a plain mapping of the type to bind to what provides it, for wiring generated elsewhere::
+
+        {
+            "app.db.Database": "app.db.PostgresDatabase",
+            "app.cache.Cache": {"to": "app.cache.RedisCache", "lifetime": "singleton", "kwargs": {"ttl": 30}},
+            "app.db.Session": {"to": "app.db.make_session", "lifetime": "scoped", "scope": "request"}
+        }
+
+    Names are dotted paths, "module:Qualified.Name" works too. An implementation is either a name or a mapping with
+    `to` (defaults to the bound type itself), `lifetime` (one of transient, singleton, weak_singleton, cached, scoped or
+    pooled), `maxsize` and `ttl` for cached bindings, `scope` and `dispose` for scoped ones, `min`, `max` and `dispose`
+    for pooled ones and `args`/`kwargs` passed along with `Binding.with_args`. A list of
+    implementations binds each of them. Specs may also be wrapped as {"bindings": {...}}.
+    """
+    if "bindings" in spec and isinstance(spec["bindings"], Mapping):
+        spec = spec["bindings"]
+    names = _Names()
+    bindings = []
+    for bound, implementations in spec.items():
+        kls = names.resolve(bound)
+        if not isinstance(implementations, list):
+            implementations = [implementations]
+        for implementation in implementations:
+            if isinstance(implementation, str) or implementation is None:
+                implementation = {"to": implementation}
+            if not isinstance(implementation, Mapping):
+                raise SpecError(f"Binding for {bound} must be a name or a mapping, not {implementation!r}")
+            bindings.append(_binding(kls, implementation, names, bound))
+    return bindings
+
+
+def _binding(kls, options: Mapping, names: '_Names', bound: Text) -> Binding:
+    unknown = set(options) - {"to", "lifetime", "scope", "dispose", "min", "max", "maxsize", "ttl", "args", "kwargs"}
+    if unknown:
+        raise SpecError(f"Unknown options {', '.join(sorted(unknown))} in the binding for {bound}")
+    to = options.get("to")
+    binding = Binding(kls).to(names.resolve(to) if to else kls)
+    if options.get("args") or options.get("kwargs"):
+        binding.with_args(*options.get("args", ()), **options.get("kwargs", {}))
+    lifetime = options.get("lifetime", "transient")
+    if lifetime == "singleton":
+        binding.as_singleton()
+    elif lifetime == "weak_singleton":
+        binding.as_weak_singleton()
+    elif lifetime == "cached":
+        binding.as_cached(options.get("maxsize", 128), options.get("ttl"))
+    elif lifetime == "scoped":
+        dispose = options.get("dispose")
+        binding.as_scoped(options.get("scope"), names.resolve(dispose) if dispose else None)
+    elif lifetime == "pooled":
+        dispose = options.get("dispose")
+        binding.as_pooled(options.get("min", 0), options.get("max"), dispose=names.resolve(dispose) if dispose else None)
+    elif lifetime != "transient":
+        raise SpecError(f"Unknown lifetime {lifetime!r} for {bound}, expected one of {', '.join(LIFETIMES)}")
+    return binding
+
+
+class _Names(object):
+    """Resolves dotted names, each module is only imported once per spec"""
+
+    def __init__(self):
+        self._modules: Dict[Text, Any] = {}
+        self._resolved: Dict[Text, Any] = {}
+
+    def resolve(self, name: Text):
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+        if not isinstance(name, str):
+            raise SpecError(f"Expected a dotted name, not {name!r}")
+        if ":" in name:
+            module, _, qualname = name.partition(":")
+            candidates = [(module, qualname)]
+        else:
+            parts = name.split(".")
+            candidates = [(".".join(parts[:idx]), ".".join(parts[idx:])) for idx in range(len(parts) - 1, 0, -1)]
+        for module, qualname in candidates:
+            obj = self._module(module)
+            if obj is None:
+                continue
+            try:
+                for attr in qualname.split("."):
+                    obj = getattr(obj, attr)
+            except AttributeError:
+                continue
+            self._resolved[name] = obj
+            return obj
+        raise SpecError(f"Can not find {name}")
+
+    def _module(self, name: Text):
+        try:
+            return self._modules[name]
+        except KeyError:
+            pass
+        try:
+            module = importlib.import_module(name)
+        except ModuleNotFoundError as ex:
+            # only a miss when it is this module that does not exist, not something it imports
+            if ex.name is None or not (ex.name == name or name.startswith(ex.name + ".")):
+                raise SpecError(f"Can not import {name}: {ex}") from ex
+            module = None
+        except ImportError as ex:
+            raise SpecError(f"Can not import {name}: {ex}") from ex
+        self._modules[name] = module
+        return module
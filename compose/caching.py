@@ -0,0 +1,98 @@
+import threading
+import weakref
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Hashable
+
+from .extras.logging import logger
+from .metrics import type_name
+
+__all__ = [
+    'InstanceCache',
+    'Missing'
+]
+
+
+class Missing(object):
+    """Returned by `InstanceCache.get` when nothing is cached"""
+
+
+class InstanceCache(object):
+    """The instances of cached bindings (see `Binding.as_cached`) and weak singletons (see
+    `Binding.as_weak_singleton`) of one container.
+
+    Cached instances are kept per binding and key, the type that was asked for so each specialization of a generic
+    gets its own, least recently used first out once there are more than the binding's `maxsize` and dropped once
+    older than its `ttl`. Weak singletons are only referenced weakly, they are reused while something else holds on
+    to them and built again once collected.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cached: Dict[Any, OrderedDict] = {}
+        self._weak = weakref.WeakValueDictionary()
+
+    def get(self, binding, key: Hashable):
+        if binding._as_weak_singleton:
+            return self._weak.get(binding, Missing)
+        with self._lock:
+            entries = self._cached.get(binding)
+            if not entries:
+                return Missing
+            try:
+                obj, expires = entries[key]
+            except KeyError:
+                return Missing
+            if expires is not None and expires <= monotonic():
+                del entries[key]
+                return Missing
+            entries.move_to_end(key)
+            return obj
+
+    def put(self, binding, key: Hashable, obj):
+        """Caches `obj` unless another thread or task got there first, returns what ends up cached"""
+        if binding._as_weak_singleton:
+            with self._lock:
+                cached = self._weak.get(binding, Missing)
+                if cached is not Missing:
+                    return cached
+                try:
+                    self._weak[binding] = obj
+                except TypeError:
+                    logger.warning("%s can not be referenced weakly and is not kept as a weak singleton", obj)
+                return obj
+        maxsize, ttl = binding._cache_options
+        with self._lock:
+            entries = self._cached.setdefault(binding, OrderedDict())
+            cached = entries.get(key)
+            if cached is not None and (cached[1] is None or cached[1] > monotonic()):
+                entries.move_to_end(key)
+                return cached[0]
+            entries[key] = (obj, monotonic() + ttl if ttl is not None else None)
+            entries.move_to_end(key)
+            if maxsize is not None:
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return obj
+
+    def clear(self, binding=None):
+        """Forgets every cached instance, or only those of `binding`"""
+        with self._lock:
+            if binding is None:
+                self._cached.clear()
+                self._weak.clear()
+            else:
+                self._cached.pop(binding, None)
+                self._weak.pop(binding, None)
+
+    def sizes(self) -> Dict[str, int]:
+        """How many instances are cached per bound type, weak singletons that are still alive count as one"""
+        with self._lock:
+            sizes = {}
+            for binding, entries in self._cached.items():
+                name = type_name(binding.bound_to)
+                sizes[name] = sizes.get(name, 0) + len(entries)
+            for binding in list(self._weak.keys()):
+                name = type_name(binding.bound_to)
+                sizes[name] = sizes.get(name, 0) + 1
+            return sizes
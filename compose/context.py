@@ -1,22 +1,60 @@
+import asyncio
 import inspect
 import sys
 import traceback
+from collections import abc
+from contextvars import ContextVar
+from copy import copy
 from dataclasses import dataclass, field, fields
 from functools import partial
 from itertools import chain
-from typing import Type, Text
+from time import perf_counter
+from typing import Optional, Type, Text
 
 from .exceptions import DependencyError, InstantiationError, OptionalRequirementNotFound, ContractFailure, \
-    InvalidBindType, ComposeError, RequirementNotFound, TooManyProviders
+    InvalidBindType, ComposeError, RequirementNotFound, TooManyProviders, ScopeError, CircularDependency
 from .extras import clsname, LocationInfo
 from .extras.generics import *
 from .extras.logging import logger
 from .extras.undef import Undefined, is_defined
-from .modifiers import Required, Lazy
-from .proxying import LazyProxy
+from .metrics import type_name
+from .caching import Missing
+from .modifiers import Lazy
+from .planning import hooks_of, parameters_of
+from .proxying import lazy_proxy
+from .scoping import current_scope
 from .util import is_resolvable, walk
 
 
+class NotFound(object):
+    """Returned by `InstantiationContext.find_arg` when nothing provides a requirement"""
+
+
+class Unsupported(object):
+    """Returned by `InstantiationContext.find_arg` for requirements Compose can never provide"""
+
+
+# Requirements handed the providers one at a time instead of a list, see `InstantiationContext.stream_arg`
+STREAMS = (abc.Iterator, abc.Iterable)
+
+
+# What the resolution running in this thread or task is building, for the `Lazy` proxies and streams resolved in it
+_building: ContextVar[Optional[set]] = ContextVar("compose_building", default=None)
+
+
+class ProviderStream(object):
+    """What an `Iterable[...]` requirement is given. Every iteration goes over the providers again, building each one
+    when it is reached.
+    """
+    __slots__ = ("_iterate",)
+
+    def __init__(self, iterate):
+        self._iterate = iterate
+
+    def __iter__(self):
+        return self._iterate()
+
+
 @dataclass
 class InstantiationContext(object):
     target: Type
@@ -24,10 +62,25 @@ class InstantiationContext(object):
     compose: 'Compose'
 
     _provider = None
+    # Time spent building the dependencies of the provider, for `Compose.stats`
+    _nested = 0.0
     _lazy: bool = False
     resolving_key: Text = field(init=False, default=Undefined)
     resolving_type: Type = field(init=False, default=Undefined)
 
+    def __post_init__(self):
+        # The bindings being built in this resolution, shared by every context under the same root so a binding
+        # turning up again is caught straight away instead of recursing until RecursionError.
+        parent = self.parent
+        if isinstance(parent, InstantiationContext):
+            self._in_flight = parent._in_flight
+            self._tracer = parent._tracer
+        else:
+            self._in_flight = set()
+            # Whether a resolution is traced is decided once, at its root
+            tracer = getattr(self.compose, "_tracer", None)
+            self._tracer = tracer if tracer is not None and tracer.sample() else None
+
     @property
     def is_root(self):
         return self.parent is Undefined
@@ -42,54 +95,303 @@ class InstantiationContext(object):
 
     @property
     def instance(self):
-        if self._provider.is_singleton:
-            return self._provider.factory()
+        provider = self._provider
+        if provider.is_singleton:
+            if self.compose._metrics is not None:
+                self.compose._metrics.singleton_hit(provider)
+            return provider.singleton
+        if provider._as_scoped:
+            return self.open_scope().get(provider, self.create, provider._dispose)
+        if provider._as_pooled:
+            pool = provider.get_pool()
+            return self.open_scope().get(provider, partial(pool.acquire, self.owned().create), pool.release)
+        if provider._as_cached or provider._as_weak_singleton:
+            return self.owned().cached_instance()
+        if not provider._as_singleton:
+            return self.create()
+        with provider.lock:
+            # Another thread may have finished building it while this one waited for the lock
+            if provider.is_singleton:
+                if self.compose._metrics is not None:
+                    self.compose._metrics.singleton_hit(provider)
+                return provider.singleton
+            obj = self.owned().create()
+            provider.singleton = obj
+            provider.is_singleton = True
+            return obj
+
+    async def ainstance(self):
+        """`instance` for `Compose.aprovide`, tasks asking for a singleton that is being built wait for it"""
+        provider = self._provider
+        if provider.is_singleton:
+            if self.compose._metrics is not None:
+                self.compose._metrics.singleton_hit(provider)
+            return provider.singleton
+        if provider in self._in_flight:
+            # waiting on its own pending build would never finish
+            self.raise_circular()
+        if provider._as_scoped:
+            return await self.open_scope().aget(provider, self.acreate, provider._dispose)
+        if provider._as_pooled:
+            pool = provider.get_pool()
+            return await self.open_scope().aget(provider, partial(pool.aacquire, self.owned().acreate), pool.release)
+        if provider._as_cached or provider._as_weak_singleton:
+            cache, key = self.compose._cached_instances, self.cache_key()
+            obj = cache.get(provider, key)
+            if obj is Missing:
+                # tasks building it at the same time all end up with the one cached first
+                return cache.put(provider, key, await self.owned().acreate())
+            return obj
+        if not provider._as_singleton:
+            return await self.acreate()
+        with provider.lock:
+            if provider.is_singleton:
+                return provider.singleton
+            if provider._pending is None:
+                provider._pending = asyncio.ensure_future(self.owned()._abuild_singleton())
+            pending = provider._pending
+        # shielded so one waiter being cancelled does not cancel the build for everyone else
+        return await asyncio.shield(pending)
+
+    async def _abuild_singleton(self):
+        provider = self._provider
         try:
-            obj = self.call_method(self._provider.factory)
-            if hasattr(obj, "requires"):
-                self.call_method(obj.requires, default_required=True)
-            if hasattr(obj, "accepts"):
-                self.call_method(obj.accepts, default_required=False)
-            if self._provider._as_singleton:
-                self._provider._factory = lambda: obj
-                self._provider.is_singleton = True
+            obj = await self.acreate()
+            with provider.lock:
+                provider.singleton = obj
+                provider.is_singleton = True
+            return obj
+        finally:
+            provider._pending = None
+
+    def owned(self) -> 'InstantiationContext':
+        """The context to build an instance kept on the provider in, shared by every container that can see it. That
+        is this one unless the provider is bound in a parent of the container providing, then it is a copy for that
+        parent so what the child container overrides does not end up in the parent's instances.
+        """
+        compose = self.compose
+        if getattr(compose, "_parent", None) is None:
+            return self
+        bundle = getattr(self, "provider_bundle", None)
+        if bundle is None:
+            return self
+        owner = compose._owner(bundle)
+        if owner is compose:
+            return self
+        context = copy(self)
+        context.compose = owner
+        return context
+
+    def cache_key(self):
+        """What cached instances of the provider are kept under, the type asked for"""
+        try:
+            hash(self.target)
+        except TypeError:
+            return None
+        return self.target
+
+    def cached_instance(self):
+        provider = self._provider
+        cache, key = self.compose._cached_instances, self.cache_key()
+        obj = cache.get(provider, key)
+        if obj is Missing:
+            with provider.lock:
+                obj = cache.get(provider, key)
+                if obj is Missing:
+                    return cache.put(provider, key, self.create())
+        if self.compose._metrics is not None:
+            self.compose._metrics.singleton_hit(provider)
+        return obj
+
+    def open_scope(self):
+        provider = self._provider
+        scope = current_scope()
+        if scope is not None:
+            scope = scope.find(self.compose, provider._scope_name)
+        if scope is None or scope.closed:
+            scope_name = f"'{provider._scope_name}' " if provider._scope_name else ""
+            lifetime = "pooled" if provider._as_pooled else "scoped"
+            raise ScopeError(f"{provider._config_for} is {lifetime} but no {scope_name}scope is open. "
+                             f"Use `with compose.scope():`", self)
+        return scope
+
+    def create(self):
+        """Calls the provider's factory and the `requires` and `accepts` hooks of what it returns"""
+        provider = self._provider
+        in_flight = self._in_flight
+        if provider in in_flight:
+            self.raise_circular()
+        in_flight.add(provider)
+        building = _building.set(in_flight)
+        metrics = self.compose._metrics
+        start = perf_counter() if metrics is not None else 0
+        tracer = self._tracer
+        span = tracer.begin(clsname(provider.bound_to), "instance", self.span_args()) if tracer is not None else None
+        try:
+            obj = self.call_method(provider.factory)
+            for name, default_required in hooks_of(obj):
+                hook = getattr(obj, name, Undefined)
+                if is_defined(hook):
+                    hook_span = tracer.begin(name, "hook") if tracer is not None else None
+                    try:
+                        self.call_method(hook, default_required=default_required)
+                    finally:
+                        if hook_span is not None:
+                            tracer.end(hook_span)
+            if metrics is not None:
+                self.record_created(metrics, perf_counter() - start)
             return obj
-        except DependencyError as ex:
-            raise InstantiationError(f"Unable to Instantiate {self._provider._config_for}, ", self) from ex
-        except InstantiationError as ex:
-            raise InstantiationError(f"Unable to Instantiate {self._provider._config_for}", self) from ex
         except Exception as ex:
-            raise InstantiationError(f"Unable to Instantiate {self._provider._config_for}", self) from ex
+            if metrics is not None:
+                metrics.failed(provider)
+            raise self.instantiation_error(ex) from ex
+        finally:
+            in_flight.discard(provider)
+            _building.reset(building)
+            if span is not None:
+                tracer.end(span)
+
+    async def acreate(self):
+        provider = self._provider
+        in_flight = self._in_flight
+        if provider in in_flight:
+            self.raise_circular()
+        in_flight.add(provider)
+        building = _building.set(in_flight)
+        metrics = self.compose._metrics
+        start = perf_counter() if metrics is not None else 0
+        tracer = self._tracer
+        span = tracer.begin(clsname(provider.bound_to), "instance", self.span_args()) if tracer is not None else None
+        try:
+            obj = await self.acall_method(provider.factory)
+            for name, default_required in hooks_of(obj):
+                hook = getattr(obj, name, Undefined)
+                if is_defined(hook):
+                    hook_span = tracer.begin(name, "hook") if tracer is not None else None
+                    try:
+                        await self.acall_method(hook, default_required=default_required)
+                    finally:
+                        if hook_span is not None:
+                            tracer.end(hook_span)
+            if metrics is not None:
+                self.record_created(metrics, perf_counter() - start)
+            return obj
+        except Exception as ex:
+            if metrics is not None:
+                metrics.failed(provider)
+            raise self.instantiation_error(ex) from ex
+        finally:
+            in_flight.discard(provider)
+            _building.reset(building)
+            if span is not None:
+                tracer.end(span)
+
+    def span_args(self):
+        provider = self._provider
+        return {"target": type_name(self.target), "bound_to": type_name(provider.bound_to),
+                "provides": type_name(provider.provide_type),
+                "lifetime": lifetime_of(provider)}
+
+    def record_created(self, metrics, elapsed):
+        # Contexts are shared by the providers of a `List[...]` so the nested time is taken back out once recorded
+        nested, self._nested = self._nested, 0.0
+        metrics.created(self._provider, elapsed, elapsed - nested)
+        if isinstance(self.parent, InstantiationContext):
+            self.parent._nested += elapsed
+
+    def raise_circular(self):
+        """Raises `CircularDependency` for the provider of this context, which is already being built further up"""
+        cycle = []
+        for node in self.instantiation_chain():
+            cycle.append(clsname(node.provider._config_for))
+            if node is not self and node.provider is self._provider:
+                break
+        raise CircularDependency(f"Circular dependency {' -> '.join(reversed(cycle))}", self)
+
+    def instantiation_error(self, cause: Exception) -> InstantiationError:
+        separator = ", " if isinstance(cause, DependencyError) else ""
+        return InstantiationError(f"Unable to Instantiate {self._provider._config_for}{separator}", self)
+
+    def call_method(self, method, default_required: bool = Undefined, parameters=Undefined):
+        if parameters is Undefined:
+            parameters = parameters_of(method)
+        args, kwargs = self.arguments(method, parameters, default_required, self.find_parameter)
+        obj = self.invoke(method, args, kwargs, parameters)
+        if inspect.iscoroutine(obj):
+            obj.close()
+            raise ComposeError(f"{method} is asynchronous, use Compose.aprovide to provide it", location=method)
+        return obj
+
+    async def acall_method(self, method, default_required: bool = Undefined, parameters=Undefined):
+        """`call_method` for `Compose.aprovide`. The parameters are resolved concurrently and the result is awaited
+        if the method is asynchronous.
+        """
+        if parameters is Undefined:
+            parameters = parameters_of(method)
+        found = {}
+        if parameters:
+            outcomes = await asyncio.gather(*(self.afind_arg(param.annotation) for param in parameters),
+                                            return_exceptions=True)
+            found = dict(zip(parameters, outcomes))
+
+        def find(param):
+            outcome = found[param]
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
 
-    def call_method(self, method, default_required: bool = Undefined):
+        args, kwargs = self.arguments(method, parameters, default_required, find)
+        obj = self.invoke(method, args, kwargs, parameters)
+        if inspect.iscoroutine(obj):
+            span = self._tracer.begin(method_name(method), "call") if self._tracer is not None else None
+            try:
+                obj = await obj
+            finally:
+                if span is not None:
+                    self._tracer.end(span)
+        return obj
+
+    def find_parameter(self, param):
+        return self.find_arg(param.annotation)
+
+    def arguments(self, method, parameters, default_required, find):
+        """Works out the args and kwargs to call `method` with. `find` is given each `ParameterPlan` and returns what
+        `find_arg` would for it.
+        """
         kwargs = {}
         args = []
-        signature = None
 
-        try:
-            signature = inspect.signature(method)
-        except ValueError:
-            # if there is nothing to inspect inspect.signature throws ValueError
-            pass
         optional = not default_required if is_defined(default_required) else Undefined
-        if signature:
-            for k, param in signature.parameters.items():
-                if param.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
-                    continue
+        if parameters is not None:
+            for param in parameters:
+                k = param.name
                 self.resolving_key = k
-                default_provided = param.default not in (param.empty, Required)
+                default_provided = param.default_provided
 
-                param_optional = is_optional(param.annotation) or optional or default_provided
+                param_optional = param.optional or optional or default_provided
 
                 try:
-                    arg_value = self.resolve_arg(param.annotation)
-                except OptionalRequirementNotFound:
-                    logger.debug(f"Optional dependency for {k} not found. Type: {param.annotation}")
-                    if param.kind == inspect.Parameter.POSITIONAL_ONLY:
-                        value = param.default or None
-                        logger.warning(f"Optional dependency not found position onluy parameter {k}. "
-                                       f"Using value {value}")
-                        args.append(param.default or None)
+                    arg_value = find(param)
+                    if arg_value is NotFound or arg_value is Unsupported:
+                        if arg_value is NotFound and param_optional and self.compose._metrics is not None:
+                            self.compose._metrics.optional_miss(param.annotation)
+                        if arg_value is NotFound and param.optional:
+                            logger.debug("Optional dependency for %s not found. Type: %s", k, param.annotation)
+                            if param.positional_only:
+                                value = param.default or None
+                                logger.warning("Optional dependency not found position onluy parameter %s. "
+                                               "Using value %s", k, value)
+                                args.append(param.default or None)
+                            continue
+                        if not param_optional:
+                            # Only build the full error when it is going to be raised
+                            self.raise_missing(param.annotation, arg_value)
+                        if not default_provided and param_optional:
+                            args.append(None)
+                        # don't log optional unsupported types since they can't ever be resolved.
+                        if arg_value is NotFound:
+                            logger.debug("Optional dependency not resolved %s:%s", k, param.annotation)
+                        continue
                 except InstantiationError as ex:
                     if not param_optional:
                         raise ContractFailure(f"Unable to fulfill contract for {k}:{param.annotation}",
@@ -97,21 +399,28 @@ class InstantiationContext(object):
                                               context=self,
                                               location=method) from ex
                     else:
+                        if self.compose._metrics is not None:
+                            self.compose._metrics.optional_miss(param.annotation, error=True)
                         if not default_provided and param_optional:
                             args.append(None)
                         # don't log optional InvalidBindType since they can't ever be resolved.
                         if not isinstance(ex, InvalidBindType):
-                            logger.debug(f"Optional dependency not resolved {k}:{param.annotation}")
+                            logger.debug("Optional dependency not resolved %s:%s", k, param.annotation)
                 else:
-                    if param.kind == inspect.Parameter.POSITIONAL_ONLY:
+                    if param.positional_only:
                         args.append(arg_value)
                     else:
                         kwargs[k] = arg_value
 
-            logger.debug(f"Calling {method} with {kwargs.keys()}")
+            logger.debug("Calling %s with %s", method, kwargs.keys())
+        return args, kwargs
+
+    def invoke(self, method, args, kwargs, parameters):
+        span = self._tracer.begin(method_name(method), "call") if self._tracer is not None else None
         try:
-            obj = method(*args, **kwargs)
+            return method(*args, **kwargs)
         except TypeError as ex:
+            param = parameters[-1] if parameters else None
             ex_type, ex_ex, ex_tb = sys.exc_info()
             traceback.print_tb(ex_tb)
             if isinstance(method, partial):
@@ -135,8 +444,9 @@ class InstantiationContext(object):
                       "that is not being provided by compose and then Compose could not generate a useful message" \
                       f"This is the resulting message. \n Troubleshooting  info:\n {param}"
             raise ComposeError(msg, location=method) from ex
-
-        return obj
+        finally:
+            if span is not None:
+                self._tracer.end(span)
 
     def lazy_resolve(self, ):
         self.resolve(self.target)
@@ -148,40 +458,110 @@ class InstantiationContext(object):
         if is_defined(resolved):
             return resolved
 
+    async def aresolve(self, kls, lazy=False):
+        self.resolving_type = kls
+        context = self.__class__(kls, self, self.compose, _lazy=lazy)
+        # Requirements are resolved concurrently, each branch needs its own view of what is being built
+        context._in_flight = set(self._in_flight)
+        return await self.compose.aprovide_all(kls, context)
+
     def resolve_arg(self, arg, lazy=False):
+        arg_value = self.find_arg(arg, lazy=lazy)
+        if arg_value is NotFound or arg_value is Unsupported:
+            self.raise_missing(arg, arg_value)
+        return arg_value
+
+    def find_arg(self, arg, lazy=False):
+        """`resolve_arg` without the exceptions for requirements that can not be provided. `NotFound` is returned when
+        nothing provides `arg` and `Unsupported` when Compose can never provide it. Errors from instantiating a
+        provider are still raised.
+        """
+        found = self.prepare_arg(arg, lazy)
+        if found is not Undefined:
+            return found
+        items = []
+        for req in list(get_args(arg)) or [arg]:
+            if is_generic_type(req):
+                found = self.find_arg(req)
+                if found is Unsupported:
+                    self.raise_missing(req, found)
+                if found is not NotFound:
+                    items.extend(found)
+            else:
+                items.extend(self.resolve(req, ))
+        return self.select_arg(arg, items)
+
+    async def afind_arg(self, arg, lazy=False):
+        found = self.prepare_arg(arg, lazy)
+        if found is not Undefined:
+            return found
         items = []
+        for req in list(get_args(arg)) or [arg]:
+            if is_generic_type(req):
+                found = await self.afind_arg(req)
+                if found is Unsupported:
+                    self.raise_missing(req, found)
+                if found is not NotFound:
+                    items.extend(found)
+            else:
+                items.extend(await self.aresolve(req, ))
+        return self.select_arg(arg, items)
+
+    def prepare_arg(self, arg, lazy):
+        """Deals with the requirements that are answered without looking for providers, returns Undefined for the
+        rest
+        """
         if arg is None:
-            return items
+            return []
         if not is_resolvable(arg):
-            logger.warning(f"Using a {type(arg)} as a datatype will probably have dire consequences")
+            logger.warning("Using a %s as a datatype will probably have dire consequences", type(arg))
         elif not self.is_supported(arg):
-            raise InvalidBindType(f"Requirement of parameter type {arg} found. Compose can not provide these.",
-                                  context=self)
+            return Unsupported
 
-        optional = is_optional(arg)
         # Special cases for certain generic classes
-        origin = get_origin(arg)
-        if lazy or origin is Lazy:
+        if lazy or get_origin(arg) is Lazy:
             arg = get_args(arg)[0]
-            logger.debug(f"{arg} marked as Lazy will not resolve yet")
-            return LazyProxy(partial(self.resolve_arg, arg))
+            logger.debug("%s marked as Lazy will not resolve yet", arg)
+            return lazy_proxy(arg, partial(self.resolve_deferred, arg))
+        origin = get_origin(arg)
+        if origin in STREAMS and get_args(arg):
+            item = get_args(arg)[0]
+            if origin is abc.Iterator:
+                return self.stream_arg(item)
+            return ProviderStream(partial(self.stream_arg, item))
+        return Undefined
 
-        args = list(get_args(arg)) or [arg]
+    def deferred(self) -> 'InstantiationContext':
+        """A copy of this context for a `Lazy` proxy or stream resolved after the resolution it came from, maybe in
+        another thread. What is being built is tracked with the resolution running where it is used, if any, instead of
+        the one it came from which others may share.
+        """
+        context = copy(self)
+        in_flight = _building.get()
+        context._in_flight = in_flight if in_flight is not None else set()
+        return context
 
-        for req in args:
-            if is_generic_type(req):
-                try:
-                    items.extend(self.resolve_arg(req))
-                except RequirementNotFound:
-                    pass
-            else:
-                items.extend(self.resolve(req, ))
+    def resolve_deferred(self, arg):
+        return self.deferred().resolve_arg(arg)
 
+    def stream_arg(self, arg):
+        """The providers of `arg` for an `Iterator[...]` or `Iterable[...]` requirement, each one is only built once
+        the consumer gets to it. Providers are built synchronously, even under `Compose.aprovide`.
+        """
+        context = self.deferred()
+        if is_generic_type(arg):
+            found = context.find_arg(arg)
+            if found is Unsupported:
+                context.raise_missing(arg, found)
+            if found is not NotFound:
+                yield from found if isinstance(found, list) else [found]
+            return
+        context.resolving_type = arg
+        yield from self.compose.provide_all(arg, context.__class__(arg, context, self.compose))
+
+    def select_arg(self, arg, items):
         if len(items) == 0:
-            if optional:
-                raise OptionalRequirementNotFound("", arg, self)
-            else:
-                raise RequirementNotFound(f"Could not find {arg}", arg, self)
+            return NotFound
         if get_origin(arg) != list:
             if len(items) > 1:
                 raise TooManyProviders(f"Too many {arg} found", items, self)
@@ -189,6 +569,15 @@ class InstantiationContext(object):
                 return items[0]
         return items
 
+    def raise_missing(self, arg, reason):
+        """Raises the error `resolve_arg` reports for a `NotFound` or `Unsupported` requirement"""
+        if reason is Unsupported:
+            raise InvalidBindType(f"Requirement of parameter type {arg} found. Compose can not provide these.",
+                                  context=self)
+        if is_optional(arg):
+            raise OptionalRequirementNotFound("", arg, self)
+        raise RequirementNotFound(f"Could not find {arg}", arg, self)
+
     def is_supported(self, arg):
         try:
             return not issubclass(arg, str)
@@ -200,6 +589,12 @@ class InstantiationContext(object):
             yield node
 
 
+def method_name(method) -> Text:
+    if isinstance(method, partial):
+        method = method.func
+    return getattr(method, "__qualname__", None) or str(method)
+
+
 def print_context(context: InstantiationContext):
     stack = list(reversed(list(walk(context, lambda c: c.parent))))
     idx = 0
@@ -222,3 +617,15 @@ def print_context(context: InstantiationContext):
               f"Requires: {clsname(current_context.resolving_type)}")
         print(f"{indent}      {clsname(current_context.provider.provide_type)}.{current_context.resolving_key} ",
               f"defined in {LocationInfo(source_definition)}")
+
+
+def lifetime_of(binding) -> str:
+    if binding._as_scoped:
+        return "scoped"
+    if binding._as_pooled:
+        return "pooled"
+    if binding._as_cached:
+        return "cached"
+    if binding._as_weak_singleton:
+        return "weak_singleton"
+    return "singleton" if binding._as_singleton else "transient"
@@ -3,7 +3,7 @@ import traceback
 from collections import OrderedDict
 from contextlib import redirect_stdout
 
-from .extras import ascls, LocationInfo
+from .extras import ascls, clsname, LocationInfo
 from .extras.logging import logger
 from .extras.undef import Undefined
 from .util import walk
@@ -11,9 +11,21 @@ from .util import walk
 
 class ComposeError(Exception):
     def __init__(self, msg, location=None):
-        self.locations = source_pointer(location)
+        # Looking up source locations reads the source files, that is put off until something asks for them.
+        self._location = list(location) if isinstance(location, list) else location
+        self._locations = None
         super().__init__(msg)
 
+    @property
+    def locations(self):
+        if self._locations is None:
+            self._locations = source_pointer(self._location)
+        return self._locations
+
+    @locations.setter
+    def locations(self, locations):
+        self._locations = locations
+
     def __str__(self):
         msg = [super().__str__()]
         if len(self.locations):
@@ -28,7 +40,6 @@ class InstantiationError(ComposeError):
     def __init__(self, msg, context: 'InstantiationContext', location=None):
         self.target = context.target
         self.context = context
-        self.locations = source_pointer(location)
         super().__init__(msg, location=location)
 
 
@@ -41,7 +52,6 @@ class ContractFailure(DependencyError):
         self.key = key
         self.key_type = key_type
         self.context = context
-        self.locations = source_pointer(location)
         super().__init__(msg, context, location=location)
 
 
@@ -65,6 +75,42 @@ class InvalidBindType(DependencyError):
     pass
 
 
+class CircularDependency(DependencyError):
+    """Building something ended up needing itself"""
+    pass
+
+
+class ScopeError(DependencyError):
+    """A scoped binding was asked for outside of an open scope it can live in"""
+    pass
+
+
+class PoolExhausted(ComposeError):
+    """Every instance of a pooled binding is checked out and no more may be made"""
+    pass
+
+
+class FrozenError(ComposeError):
+    """Bindings were changed after `Compose.freeze`"""
+    pass
+
+
+class SpecError(ComposeError):
+    """A binding spec (see `FactoryBundle.add_spec`) could not be understood"""
+    pass
+
+
+class WarmupError(ComposeError):
+    """Singletons failed to build in `Compose.warmup`. `errors` has what each one raised and `timings` how long the
+    others took.
+    """
+
+    def __init__(self, msg, errors, timings, location=None):
+        super().__init__(msg, location=location)
+        self.errors = errors
+        self.timings = timings
+
+
 def source_pointer(locations):
     loc_infos = []
     if locations is None:
@@ -73,7 +119,11 @@ def source_pointer(locations):
         locations = [locations]
     for location in locations:
         location = ascls(location)
-        loc_infos.append(LocationInfo(location))
+        try:
+            loc_infos.append(LocationInfo(location))
+        except (TypeError, OSError):
+            # builtins and classes defined in C or interactively have no source to point to
+            loc_infos.append(f"{clsname(location, full=True)} (source not available)")
     return loc_infos
 
 
@@ -1,7 +1,9 @@
 import logging
 import sys
+import threading
 import typing
 from collections.abc import Callable as abcCallable
+from functools import wraps
 
 P38 = sys.version_info[:3] >= (3, 8, 0)
 P37 = sys.version_info[:2] == (3, 7)
@@ -26,6 +28,38 @@ __all__ = [
 ]
 
 
+def memoized(maxsize=4096):
+    """Caches a function of types by the identity of its arguments, keyword arguments along with their name, the
+    answers for a type never change. Holds on to at most `maxsize` answers, the oldest are dropped first. Arguments
+    are kept alive while cached so an id is not reused under an entry.
+    """
+
+    def decorator(func):
+        cache = {}
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = tuple(map(id, args))
+            if kwargs:
+                key += tuple((name, id(value)) for name, value in sorted(kwargs.items()))
+            try:
+                return cache[key][2]
+            except KeyError:
+                pass
+            result = func(*args, **kwargs)
+            with lock:
+                if len(cache) >= maxsize:
+                    del cache[next(iter(cache))]
+                cache[key] = (args, kwargs, result)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
+
+
 def get_parameters(tp):
     """Return type parameters of a parameterized type as a tuple.
     """
@@ -84,6 +118,7 @@ def get_generic_bases(tp):
     return a + getattr(tp, "__orig_bases__", ())
 
 
+@memoized()
 def is_generic_type(kls):
     """Test if the given type is a generic type. This includes Generic itself, but
     excludes special typing constructs such as Union, Tuple, Callable, ClassVar.
@@ -97,11 +132,12 @@ def is_generic_type(kls):
     return isinstance(kls, type) and issubclass(kls, typing.Generic)
 
 
+@memoized()
 def resolve_type(cls, type_name, parent=None):
     if isinstance(type_name, str) and type_name[0] != "~":
         type_name = "~" + type_name
     for base in get_generic_bases(cls):
-        res = resolve_type(base, type_name, parent=cls)
+        res = resolve_type(base, type_name, cls)
         if res is not None and str(res) != str(type_name):
             return res
 
@@ -114,6 +150,7 @@ def resolve_type(cls, type_name, parent=None):
     return None
 
 
+@memoized()
 def is_optional(kls):
     """Returns `True` if the type is `type(None)`, has a Union to none, like Optional[],  Nested `Union` arguments
      are inspected
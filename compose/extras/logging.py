@@ -1,8 +1,18 @@
 import inspect
 import logging
+import os
 
 from . import clsname
 
+__all__ = [
+    'logger',
+    'set_diagnostic',
+    'MagicLogger'
+]
+
+# Frames in these files belong to the logging machinery, not the code doing the logging.
+_internal_files = (os.path.normcase(__file__), os.path.normcase(logging.__file__))
+
 
 def get_logger_for_frame(frame_info):
     lname = None
@@ -24,6 +34,8 @@ class MagicLoggerType(type):
         frame_info = None
         stack = inspect.stack()
         for frame_info in stack[1:]:
+            if os.path.normcase(frame_info.filename) in _internal_files:
+                continue
             if frame_info.frame.f_locals.get("self", None):
                 caller_local = frame_info.frame.f_locals
                 break
@@ -35,7 +47,31 @@ class MagicLogger(metaclass=MagicLoggerType):
     pass
 
 
-DEBUG = True
-logger = logging.getLogger("compose")
-if DEBUG:
-    logger = MagicLogger
+class ComposeLogger(logging.LoggerAdapter):
+    """The logger used throughout Compose.
+
+    By default this is the plain `compose` logger, messages are only formatted when the level is enabled. In
+    diagnostic mode every message goes through `MagicLogger` instead, which names the logger after the method doing
+    the logging. That walks the stack on every call so it is only meant for tracking down problems.
+    """
+
+    def isEnabledFor(self, level):
+        return DEBUG or self.logger.isEnabledFor(level)
+
+    def log(self, level, msg, *args, **kwargs):
+        if DEBUG:
+            MagicLogger.log(level, msg, *args, stacklevel=2, **kwargs)
+        elif self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, stacklevel=2, **kwargs)
+
+
+def set_diagnostic(enabled: bool = True):
+    """Turns the stack walking `MagicLogger` on or off. It can also be turned on by setting the environment variable
+    COMPOSE_DIAGNOSTIC_LOGGING=1 before Compose is imported.
+    """
+    global DEBUG
+    DEBUG = bool(enabled)
+
+
+DEBUG = os.environ.get("COMPOSE_DIAGNOSTIC_LOGGING", "").lower() in ("1", "true", "yes", "on")
+logger = ComposeLogger(logging.getLogger("compose"), None)
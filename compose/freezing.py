@@ -0,0 +1,431 @@
+import inspect
+import threading
+from collections import abc
+from types import FunctionType, MethodType
+from typing import Any, Callable, Dict, List, Text
+
+from .context import STREAMS, InstantiationContext, ProviderStream, lifetime_of
+from .exceptions import ComposeError, FrozenError, RequirementNotFound, ScopeError
+from .extras import clsname
+from .extras.generics import get_args, get_origin, is_generic_type
+from .extras.logging import logger
+from .extras.undef import Undefined, is_defined
+from .modifiers import Lazy
+from .planning import HOOKS, hooks_of, parameters_of
+from .proxying import LazyProxy, lazy_proxy
+from .scoping import Scope, current_scope
+from .util import load_object
+
+__all__ = [
+    'FrozenCompose',
+    'freeze',
+    'load_object'
+]
+
+
+class Build(object):
+    """A call to a binding's factory followed by the `requires` and `accepts` hooks of what it returns. When the
+    factory does not say what it returns the hooks are those of the bound type, `checked` is then on and what the
+    factory returns is checked to have the same hooks.
+    """
+    __slots__ = ("factory", "args", "kwargs", "hooks", "checked")
+
+    def __init__(self, factory, args, kwargs, hooks, checked=False):
+        self.factory = factory
+        self.args = args
+        self.kwargs = kwargs
+        self.hooks = hooks
+        self.checked = checked
+
+
+class Shared(object):
+    """A `Build` whose result is kept, by the container for singletons or by the open scope for scoped bindings"""
+    __slots__ = ("binding", "build")
+
+    def __init__(self, binding, build: Build):
+        self.binding = binding
+        self.build = build
+
+
+class LazyRequirement(object):
+    """A `Lazy[...]` parameter, compiled on its own once the graph it sits in is done"""
+    __slots__ = ("context", "arg")
+
+    def __init__(self, context: 'CompilingContext', arg):
+        self.context = context
+        self.arg = arg
+
+
+class StreamRequirement(object):
+    """An `Iterator[...]` or `Iterable[...]` parameter, the builds of its providers are called as it is iterated"""
+    __slots__ = ("builds", "iterable")
+
+    def __init__(self, builds: List, iterable: bool):
+        self.builds = builds
+        self.iterable = iterable
+
+
+class _LazyOrigin(object):
+    """Stands in for the provider a `Lazy` requirement was found on so predicates still see its type"""
+
+    def __init__(self, provide_type):
+        self.provide_type = provide_type
+
+
+def class_hooks(kls, strict: bool = True):
+    """The `requires` and `accepts` hooks defined on `kls` itself. Hooks set on instances are not seen. Hooks that can
+    not be frozen raise unless `strict` is off, then they are left out.
+    """
+    hooks = []
+    if not isinstance(kls, type):
+        return hooks
+    for name, default_required in HOOKS:
+        hook = inspect.getattr_static(kls, name, None)
+        if hook is None:
+            continue
+        if isinstance(hook, staticmethod):
+            method = hook.__func__
+        elif isinstance(hook, classmethod):
+            method = getattr(kls, name)
+        elif isinstance(hook, FunctionType):
+            # only used for its signature, without the self parameter
+            method = MethodType(hook, kls)
+        elif strict:
+            raise ComposeError(f"{clsname(kls)}.{name} can not be frozen", location=kls)
+        else:
+            continue
+        hooks.append((name, default_required, method))
+    return hooks
+
+
+class CompilingContext(InstantiationContext):
+    """Works out what `InstantiationContext` would build without building it. `instance` returns the nodes the
+    `Compiler` turns into code.
+    """
+    # Whether what can not be frozen is an error. `Compose.validate` turns this off, it only follows the signatures.
+    freezing = True
+
+    @property
+    def instance(self):
+        provider = self._provider
+        if self.freezing:
+            if inspect.iscoroutinefunction(provider.factory):
+                raise ComposeError(f"{provider.factory} is asynchronous and can not be frozen",
+                                   location=provider.factory)
+            if provider._as_pooled or provider._as_cached or provider._as_weak_singleton:
+                raise ComposeError(f"{provider.bound_to} is {lifetime_of(provider)} and can not be frozen",
+                                   location=provider.factory)
+        build = self.create()
+        if provider._as_scoped or provider._as_singleton or provider.is_singleton:
+            return Shared(provider, build)
+        return build
+
+    def create(self):
+        provider = self._provider
+        if provider in self._in_flight:
+            self.raise_circular()
+        self._in_flight.add(provider)
+        try:
+            factory = provider.factory
+            args, kwargs = self.arguments(factory, parameters_of(factory), Undefined, self.find_parameter)
+            hooks = []
+            provides = provider.provide_type
+            checked = not is_defined(provides) or not isinstance(provides, type)
+            if checked:
+                # a factory without a return annotation, what it returns is only known when it is called
+                provides = provider.bound_to
+            for name, default_required, method in class_hooks(provides, self.freezing):
+                hook_args, hook_kwargs = self.arguments(method, parameters_of(method), default_required,
+                                                        self.find_parameter)
+                hooks.append((name, default_required, hook_args, hook_kwargs))
+            return Build(factory, args, kwargs, hooks, checked)
+        except Exception as ex:
+            raise self.instantiation_error(ex) from ex
+        finally:
+            self._in_flight.discard(provider)
+
+    def prepare_arg(self, arg, lazy):
+        if arg is not None and (lazy or get_origin(arg) is Lazy):
+            return LazyRequirement(self, get_args(arg)[0])
+        if arg is not None and get_origin(arg) in STREAMS and get_args(arg):
+            item = get_args(arg)[0]
+            if is_generic_type(item):
+                if self.freezing:
+                    raise ComposeError(f"Streaming the generic {item} can not be frozen",
+                                       location=self.provider.factory)
+                self.find_arg(item)
+                return StreamRequirement([], get_origin(arg) is not abc.Iterator)
+            return StreamRequirement(self.resolve(item), get_origin(arg) is not abc.Iterator)
+        return super().prepare_arg(arg, lazy)
+
+
+class Compiler(object):
+    """Turns the graphs worked out by `CompilingContext` into one Python function per build. Every function takes the
+    `FrozenCompose` it belongs to and calls the factories directly.
+    """
+
+    def __init__(self, compose: 'Compose'):
+        self.compose = compose
+        self.namespace: Dict[Text, Any] = {"_LazyProxy": LazyProxy, "_lazy_proxy": lazy_proxy,
+                                           "_ProviderStream": ProviderStream, "_ComposeError": ComposeError,
+                                           "_hooks_of": hooks_of}
+        self.objects: Dict[int, Text] = {}
+        self.builds: Dict[Text, Text] = {}
+        self.slots: Dict[Any, int] = {}
+        # The singleton bindings by slot, an in-process `FrozenCompose` keeps their instances on the bindings
+        self.singletons: Dict[int, Any] = {}
+        self.lazy: Dict[Any, Text] = {}
+        self.functions: List[Text] = []
+        self._compiled = 0
+        self._lock = threading.RLock()
+
+    def compile(self, kls) -> Callable:
+        """Returns the function that builds `kls`, raising what `Compose.provide` would if it can't be built"""
+        with self._lock:
+            context = CompilingContext(target=kls, parent=Undefined, compose=self.compose)
+            node = self.compose._only(kls, list(self.compose.provide_all(kls, context)), context)
+            name = self.function(node)
+            self.flush()
+            return self.namespace[name]
+
+    def flush(self):
+        source = "\n\n".join(self.functions[self._compiled:])
+        self._compiled = len(self.functions)
+        exec(compile(source, "<compose frozen>", "exec"), self.namespace)
+
+    def function(self, node) -> Text:
+        if isinstance(node, Shared):
+            return self.shared(node)
+        args = [self.render(arg) for arg in node.args]
+        args.extend(f"{key}={self.render(value)}" for key, value in node.kwargs.items())
+        call = f"{self.reference(node.factory)}({', '.join(args)})"
+        if node.hooks or node.checked:
+            lines = [f"    obj = {call}"]
+            if node.checked:
+                expected = tuple((name, default_required) for name, default_required, _, _ in node.hooks)
+                error = f"{node.factory} returned an object with other requires or accepts hooks than " \
+                        f"{clsname(self.compose)} froze it with, give the factory a return annotation"
+                lines.append(f"    if _hooks_of(obj) != {expected!r}:")
+                lines.append(f"        raise _ComposeError({error!r})")
+            for name, _, hook_args, hook_kwargs in node.hooks:
+                args = [self.render(arg) for arg in hook_args]
+                args.extend(f"{key}={self.render(value)}" for key, value in hook_kwargs.items())
+                lines.append(f"    obj.{name}({', '.join(args)})")
+            lines.append("    return obj")
+            body = "\n".join(lines)
+        else:
+            body = f"    return {call}"
+        try:
+            return self.builds[body]
+        except KeyError:
+            pass
+        name = self.builds[body] = f"_b{len(self.builds)}"
+        self.functions.append(f"def {name}(c):\n{body}\n")
+        return name
+
+    def shared(self, node: Shared) -> Text:
+        binding = node.binding
+        try:
+            return f"_s{self.slots[binding]}"
+        except KeyError:
+            pass
+        slot = self.slots[binding] = len(self.slots)
+        build = self.function(node.build)
+        if binding._as_scoped:
+            call = f"c._scoped({slot}, {build}, {self.render(binding._dispose)}, " \
+                   f"{self.render(binding._scope_name)}, {self.reference(binding._config_for)})"
+        else:
+            self.singletons[slot] = binding
+            call = f"c._singleton({slot}, {build})"
+        self.functions.append(f"def _s{slot}(c):\n    return {call}\n")
+        return f"_s{slot}"
+
+    def lazy_function(self, requirement: LazyRequirement) -> Text:
+        arg = requirement.arg
+        try:
+            return self.lazy[arg]
+        except KeyError:
+            pass
+        name = self.lazy[arg] = f"_l{len(self.lazy)}"
+        outer = requirement.context
+        context = CompilingContext(target=outer.target, parent=Undefined, compose=self.compose)
+        context.provider = _LazyOrigin(outer.provider.provide_type)
+        try:
+            body = f"    return {self.render(context.resolve_arg(arg))}"
+        except ComposeError as ex:
+            body = f"    raise _ComposeError({str(ex)!r})"
+        self.functions.append(f"def {name}(c):\n{body}\n")
+        return name
+
+    def render(self, value) -> Text:
+        if isinstance(value, (Build, Shared)):
+            return f"{self.function(value)}(c)"
+        if isinstance(value, LazyRequirement):
+            if isinstance(value.arg, type):
+                return f"_lazy_proxy({self.reference(value.arg)}, lambda: {self.lazy_function(value)}(c))"
+            return f"_LazyProxy(lambda: {self.lazy_function(value)}(c))"
+        if isinstance(value, StreamRequirement):
+            builds = "".join(f"{self.function(build)}, " for build in value.builds)
+            stream = f"(_f(c) for _f in ({builds}))"
+            return f"_ProviderStream(lambda: {stream})" if value.iterable else stream
+        if isinstance(value, list):
+            return f"[{', '.join(self.render(item) for item in value)}]"
+        if value is None or type(value) in (bool, int, float, str):
+            return repr(value)
+        return self.reference(value)
+
+    def reference(self, obj) -> Text:
+        try:
+            return self.objects[id(obj)]
+        except KeyError:
+            pass
+        name = self.objects[id(obj)] = f"_o{len(self.objects)}"
+        self.namespace[name] = obj
+        return name
+
+    def module_source(self, providers: Dict[Any, Callable]) -> Text:
+        lines = ["# Generated by Compose.freeze, do not edit",
+                 "from compose.exceptions import ComposeError as _ComposeError",
+                 "from compose.planning import hooks_of as _hooks_of",
+                 "from compose.freezing import FrozenCompose, load_object as _load",
+                 "from compose.context import ProviderStream as _ProviderStream",
+                 "from compose.proxying import LazyProxy as _LazyProxy, lazy_proxy as _lazy_proxy",
+                 ""]
+        roots = []
+        for kls, build in providers.items():
+            if isinstance(kls, type):
+                roots.append((self.reference(kls), build.__name__))
+            else:
+                logger.warning("%s is not a class and is left out of the frozen module", kls)
+        unimportable = []
+        for name in sorted(self.objects.values(), key=lambda n: int(n[2:])):
+            obj = self.namespace[name]
+            module, qualname = getattr(obj, "__module__", None), getattr(obj, "__qualname__", None)
+            if module is None or qualname is None or "<" in qualname or module == "__main__":
+                unimportable.append(obj)
+                continue
+            lines.append(f"{name} = _load({module!r}, {qualname!r})")
+        if unimportable:
+            raise ComposeError(f"Can not write the frozen container as a module, these can not be imported: "
+                               f"{', '.join(str(obj) for obj in unimportable)}", location=self.compose)
+        lines.append("\n")
+        lines.extend(self.functions)
+        lines.append("PROVIDERS = {")
+        lines.extend(f"    {kls}: {build}," for kls, build in roots)
+        lines.append("}")
+        lines.append("")
+        lines.append("")
+        lines.append("def load() -> FrozenCompose:")
+        lines.append("    return FrozenCompose(PROVIDERS)")
+        return "\n".join(lines) + "\n"
+
+
+class FrozenCompose(object):
+    """The container made by `Compose.freeze`. Every type is built by a function calling the factories straight away,
+    nothing is looked up while providing. Bindings can not be changed.
+    """
+
+    def __init__(self, providers: Dict[Any, Callable], compiler: Compiler = None, skipped: Dict[Any, Exception] = None):
+        self._providers = dict(providers)
+        self._compiler = compiler
+        # Singletons are shared with the container this was frozen from, through their bindings. Containers loaded
+        # from a written module have no bindings and keep their own.
+        self._bindings: Dict[int, Any] = compiler.singletons if compiler is not None else {}
+        self._singletons: Dict[int, Any] = {}
+        self._locks: Dict[int, threading.RLock] = {}
+        self._lock = threading.Lock()
+        # The bound types that could not be compiled along with why, asking for them raises the same error
+        self.skipped = dict(skipped or {})
+
+    def provide(self, kls):
+        try:
+            build = self._providers[kls]
+        except KeyError:
+            build = self._compile(kls, cache=True)
+        except TypeError:
+            build = self._compile(kls, cache=False)
+        return build(self)
+
+    def _compile(self, kls, cache):
+        if self._compiler is None:
+            raise RequirementNotFound(f"{clsname(self)} could not find binding for {clsname(kls)}", kls,
+                                      InstantiationContext(target=kls, parent=Undefined, compose=self))
+        build = self._compiler.compile(kls)
+        if cache:
+            with self._lock:
+                self._providers[kls] = build
+        return build
+
+    def _singleton(self, slot: int, build: Callable):
+        binding = self._bindings.get(slot)
+        if binding is not None:
+            if binding.is_singleton:
+                return binding.singleton
+            with binding.lock:
+                if not binding.is_singleton:
+                    binding.singleton = build(self)
+                    binding.is_singleton = True
+                return binding.singleton
+        try:
+            return self._singletons[slot]
+        except KeyError:
+            pass
+        with self._lock:
+            lock = self._locks.setdefault(slot, threading.RLock())
+        with lock:
+            if slot not in self._singletons:
+                self._singletons[slot] = build(self)
+            return self._singletons[slot]
+
+    def _scoped(self, slot: int, build: Callable, dispose: Callable, name: Text, kls):
+        scope = current_scope()
+        if scope is not None:
+            scope = scope.find(self, name)
+        if scope is None or scope.closed:
+            scope_name = f"'{name}' " if name else ""
+            raise ScopeError(f"{kls} is scoped but no {scope_name}scope is open. Use `with compose.scope():`",
+                             InstantiationContext(target=kls, parent=Undefined, compose=self))
+        return scope.get(slot, lambda: build(self), dispose)
+
+    def scope(self, name: Text = None) -> Scope:
+        """See `Compose.scope`"""
+        return Scope(self, name)
+
+    def source(self) -> Text:
+        """The source of a module that recreates this container without going through the bindings again. Its
+        `load()` returns a `FrozenCompose` for the types compiled so far.
+        """
+        if self._compiler is None:
+            raise ComposeError(f"{clsname(self)} was loaded from a module and has no source", location=self)
+        return self._compiler.module_source(self._providers)
+
+    def write_module(self, path: Text):
+        """Writes `source()` to `path`"""
+        with open(path, "w") as module:
+            module.write(self.source())
+
+    def register(self, bundle):
+        raise FrozenError(f"{clsname(self)} is frozen, bundles can not be registered", location=self)
+
+    def registry(self, bundle=None):
+        raise FrozenError(f"{clsname(self)} is frozen, bindings can not be changed", location=self)
+
+
+def freeze(compose: 'Compose') -> FrozenCompose:
+    """Compiles every bound type of `compose`, see `Compose.freeze`"""
+    compiler = Compiler(compose)
+    providers, skipped = {}, {}
+    for bundle in compose.bundles():
+        for binding in bundle.bindings():
+            kls = binding.bound_to
+            try:
+                if kls in providers or kls in skipped:
+                    continue
+            except TypeError:
+                continue
+            try:
+                providers[kls] = compiler.compile(kls)
+            except Exception as ex:
+                logger.debug("Not freezing %s: %s", kls, ex)
+                skipped[kls] = ex
+    return FrozenCompose(providers, compiler, skipped)
@@ -0,0 +1,126 @@
+import random
+import threading
+from typing import Any, Dict, List
+
+from .extras import clsname
+
+__all__ = [
+    'Metrics',
+    'BindingStats'
+]
+
+
+class BindingStats(object):
+    """What happened to one binding. Times are in seconds, `time` includes building the binding's dependencies and
+    `self_time` does not. Percentiles are taken from a random sample of at most `samples` builds.
+    """
+    __slots__ = ("binding", "created", "singleton_hits", "errors", "time", "self_time", "samples", "_limit")
+
+    def __init__(self, binding, samples: int):
+        self.binding = binding
+        self.created = 0
+        self.singleton_hits = 0
+        self.errors = 0
+        self.time = 0.0
+        self.self_time = 0.0
+        self.samples: List[float] = []
+        self._limit = samples
+
+    def record(self, elapsed: float, self_time: float):
+        self.created += 1
+        self.time += elapsed
+        self.self_time += self_time
+        if len(self.samples) < self._limit:
+            self.samples.append(self_time)
+        else:
+            # reservoir sampling, every build has the same chance of being in the sample
+            idx = random.randrange(self.created)
+            if idx < self._limit:
+                self.samples[idx] = self_time
+
+    def as_dict(self) -> Dict[str, Any]:
+        samples = sorted(self.samples)
+        binding = self.binding
+        return {
+            "bound_to": type_name(binding.bound_to),
+            "provides": type_name(binding.provide_type),
+            "created": self.created,
+            "singleton_hits": self.singleton_hits,
+            "errors": self.errors,
+            "time": self.time,
+            "self_time": self.self_time,
+            "mean": self.self_time / self.created if self.created else None,
+            "p50": percentile(samples, 50),
+            "p90": percentile(samples, 90),
+            "p99": percentile(samples, 99),
+            "max": samples[-1] if samples else None,
+        }
+
+
+def type_name(kls) -> str:
+    return clsname(kls, True) if isinstance(kls, type) else str(kls)
+
+
+def percentile(ordered: List[float], pct: float):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Metrics(object):
+    """The counters behind `Compose.stats`. Only kept while stats are enabled, the engine checks for None before
+    recording anything.
+    """
+
+    def __init__(self, samples: int = 1024):
+        self.samples = samples
+        self._bindings: Dict[Any, BindingStats] = {}
+        self._lock = threading.Lock()
+        self.plan_hits = 0
+        self.plan_builds = 0
+        self.plan_time = 0.0
+        self.optional_misses: Dict[Any, int] = {}
+        self.optional_errors: Dict[Any, int] = {}
+
+    def _stats(self, binding) -> BindingStats:
+        try:
+            return self._bindings[binding]
+        except KeyError:
+            return self._bindings.setdefault(binding, BindingStats(binding, self.samples))
+
+    def created(self, binding, elapsed: float, self_time: float):
+        with self._lock:
+            self._stats(binding).record(elapsed, max(self_time, 0.0))
+
+    def failed(self, binding):
+        with self._lock:
+            self._stats(binding).errors += 1
+
+    def singleton_hit(self, binding):
+        with self._lock:
+            self._stats(binding).singleton_hits += 1
+
+    def plan_hit(self):
+        with self._lock:
+            self.plan_hits += 1
+
+    def plan_built(self, elapsed: float):
+        with self._lock:
+            self.plan_builds += 1
+            self.plan_time += elapsed
+
+    def optional_miss(self, annotation, error=False):
+        with self._lock:
+            counts = self.optional_errors if error else self.optional_misses
+            counts[annotation] = counts.get(annotation, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            bindings = [stats.as_dict() for stats in self._bindings.values()]
+            return {
+                "bindings": sorted(bindings, key=lambda stats: stats["self_time"], reverse=True),
+                "lookups": {"plan_hits": self.plan_hits, "plan_builds": self.plan_builds,
+                            "plan_time": self.plan_time},
+                "optional_misses": {type_name(kls): count for kls, count in self.optional_misses.items()},
+                "optional_errors": {type_name(kls): count for kls, count in self.optional_errors.items()},
+            }
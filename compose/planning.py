@@ -0,0 +1,153 @@
+import inspect
+import weakref
+from types import MethodType
+from typing import Any, Dict, Iterable, List, Optional, Set, Text, Tuple
+
+from .extras.generics import get_args, get_origin, is_generic_type, is_optional
+from .modifiers import Lazy, Required
+
+
+class ParameterPlan(object):
+    """Everything `InstantiationContext.call_method` needs to know about a single parameter of a factory, worked out
+    once instead of on every call.
+    """
+    __slots__ = ("name", "annotation", "default", "positional_only", "default_provided", "optional")
+
+    def __init__(self, param: inspect.Parameter):
+        self.name: Text = param.name
+        self.annotation = param.annotation
+        self.default = param.default
+        self.positional_only = param.kind == inspect.Parameter.POSITIONAL_ONLY
+        self.default_provided = param.default not in (param.empty, Required)
+        self.optional = is_optional(param.annotation)
+
+
+def plan_parameters(method) -> Optional[Tuple[ParameterPlan, ...]]:
+    """Returns the injectable parameters of `method`, or None if it can not be inspected"""
+    try:
+        signature = inspect.signature(method)
+    except ValueError:
+        # if there is nothing to inspect inspect.signature throws ValueError
+        return None
+    return tuple(ParameterPlan(param) for param in signature.parameters.values()
+                 if param.kind not in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD))
+
+
+# Plans are kept for as long as the callable they describe. Bound methods are created on every attribute access so
+# they are keyed by the function they wrap, partials (see `Binding.with_args`) are keyed by the partial itself.
+_parameter_plans = weakref.WeakKeyDictionary()
+_bound_parameter_plans = weakref.WeakKeyDictionary()
+_hook_plans = weakref.WeakKeyDictionary()
+
+HOOKS = (("requires", True), ("accepts", False))
+
+
+def parameters_of(method) -> Optional[Tuple[ParameterPlan, ...]]:
+    """Cached `plan_parameters`. Callables that can not be weakly referenced are inspected every time."""
+    plans, key = _parameter_plans, method
+    if isinstance(method, MethodType):
+        plans, key = _bound_parameter_plans, method.__func__
+    try:
+        return plans[key]
+    except KeyError:
+        pass
+    except TypeError:
+        return plan_parameters(method)
+    parameters = plans[key] = plan_parameters(method)
+    return parameters
+
+
+def hooks_of(obj) -> Tuple[Tuple[Text, bool], ...]:
+    """Returns the `requires` and `accepts` hooks `obj` has along with whether their parameters default to required.
+
+    The answer is worked out once per class. Classes with a `__getattr__` could answer differently per instance, those
+    and anything with hooks set on the instance itself are checked every time.
+    """
+    kls = type(obj)
+    try:
+        hooks = _hook_plans[kls]
+    except (KeyError, TypeError):
+        hooks = _plan_hooks(kls)
+    if hooks is None:
+        return tuple(hook for hook in HOOKS if hasattr(obj, hook[0]))
+    instance_vars = getattr(obj, "__dict__", None)
+    if instance_vars and any(name in instance_vars for name, _ in HOOKS):
+        return tuple(hook for hook in HOOKS if hasattr(obj, hook[0]))
+    return hooks
+
+
+def _plan_hooks(kls):
+    hooks = None
+    if not hasattr(kls, "__getattr__"):
+        hooks = tuple(hook for hook in HOOKS if hasattr(kls, hook[0]))
+    try:
+        _hook_plans[kls] = hooks
+    except TypeError:
+        pass
+    return hooks
+
+
+def requirement_types(annotation) -> Iterable:
+    """The types `InstantiationContext.find_arg` looks for providers of to fill a parameter annotated with
+    `annotation`. Lazy requirements are left out, they are not needed to build anything.
+    """
+    if annotation is None or annotation is inspect.Parameter.empty or get_origin(annotation) is Lazy:
+        return
+    for req in get_args(annotation) or (annotation,):
+        if req is not annotation and is_generic_type(req):
+            yield from requirement_types(req)
+        elif req is type(None) or (isinstance(req, type) and issubclass(req, str)):
+            continue
+        else:
+            yield req
+
+
+def binding_requirements(binding) -> Iterable:
+    """The requirement types of a binding's factory and of the `requires` and `accepts` hooks of what it provides"""
+    methods = [binding.factory]
+    provides = binding.provide_type
+    if isinstance(provides, type):
+        methods.extend(getattr(provides, name) for name, _ in HOOKS if hasattr(provides, name))
+    for method in methods:
+        for param in parameters_of(method) or ():
+            yield from requirement_types(param.annotation)
+
+
+def dependency_levels(depends_on: Dict[Any, Set[Any]]) -> List[List[Any]]:
+    """Groups the nodes of a dependency graph so each group only depends on the groups before it. Nodes stuck in a
+    cycle all end up in the last group.
+    """
+    remaining = {node: set(dependencies) & depends_on.keys() for node, dependencies in depends_on.items()}
+    levels = []
+    while remaining:
+        level = [node for node, dependencies in remaining.items() if not dependencies]
+        if not level:
+            levels.append(list(remaining))
+            break
+        levels.append(level)
+        for node in level:
+            del remaining[node]
+        for dependencies in remaining.values():
+            dependencies.difference_update(level)
+    return levels
+
+
+class ResolutionPlan(object):
+    """The bindings able to provide a type, recorded the first time Compose resolves it.
+
+    Only the type matching is recorded. Predicates added with `Binding.on` depend on the instantiation chain so they
+    are still checked every time the plan is run. Bundles that can not be planned (see `ComposeBundle.plan`) are
+    searched as before.
+    """
+    __slots__ = ("target", "steps")
+
+    def __init__(self, target, steps: List[Tuple['ComposeBundle', Any, Optional[List['Binding']]]]):
+        self.target = target
+        self.steps = steps
+
+    def providers(self, context):
+        for bundle, check_kls, candidates in self.steps:
+            if candidates is None:
+                yield bundle, bundle.find(self.target, context)
+            else:
+                yield bundle, (binding for binding in candidates if binding.check(check_kls, context))
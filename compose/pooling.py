@@ -0,0 +1,213 @@
+import asyncio
+import threading
+from collections import deque
+from time import monotonic
+from typing import Awaitable, Callable, Dict, Optional
+
+from .exceptions import PoolExhausted
+from .extras.logging import logger
+
+__all__ = [
+    'Pool'
+]
+
+# Returned by `Pool._reserve` when there is room for a new instance instead of an idle one
+_NEW = object()
+
+
+class Pool(object):
+    """The instances of a pooled binding (see `Binding.as_pooled`). An instance is checked out by one user at a time
+    and goes back to the pool when released instead of being thrown away.
+
+    :param minimum: instances built the first time the pool is used
+    :param maximum: most instances there can be, checked out or idle. No limit when None
+    :param validate: called with an instance as it is released, a false result or an error drops it from the pool
+    :param dispose: called with instances dropped from the pool and when it is closed
+    :param blocking: whether checking out waits for an instance when the pool is exhausted, or raises `PoolExhausted`
+    :param timeout: seconds to wait for, None waits for as long as it takes
+    """
+
+    def __init__(self, name: str, minimum: int = 0, maximum: int = None, validate: Callable = None,
+                 dispose: Callable = None, blocking: bool = True, timeout: float = None):
+        if maximum is not None and maximum < max(minimum, 1):
+            raise ValueError(f"The pool of {name} can not hold at most {maximum} with at least {minimum}")
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.validate = validate
+        self.dispose = dispose
+        self.blocking = blocking
+        self.timeout = timeout
+        self._idle = deque()
+        # instances alive, idle or checked out, and the ones being built
+        self._size = 0
+        self._filled = False
+        self.closed = False
+        self._available = threading.Condition(threading.Lock())
+        self.created = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.discarded = 0
+        self.peak = 0
+
+    def _reserve(self, blocking: bool, timeout: Optional[float]):
+        """An idle instance or `_NEW` when one may be built, waiting for either if need be"""
+        deadline = None
+        waited = None
+        with self._available:
+            try:
+                while True:
+                    if self._idle:
+                        obj = self._idle.pop()
+                        break
+                    if self.maximum is None or self._size < self.maximum:
+                        self._size += 1
+                        obj = _NEW
+                        break
+                    if not blocking:
+                        raise PoolExhausted(f"All {self.maximum} instances of {self.name} are checked out")
+                    if waited is None:
+                        waited = monotonic()
+                        self.waits += 1
+                        deadline = waited + timeout if timeout is not None else None
+                    remaining = deadline - monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolExhausted(f"No instance of {self.name} was released within {timeout}s")
+                    self._available.wait(remaining)
+            finally:
+                if waited is not None:
+                    self.wait_time += monotonic() - waited
+            self.checkouts += 1
+            self.peak = max(self.peak, self._size - len(self._idle))
+            return obj
+
+    def _build(self, create: Callable[[], object]):
+        try:
+            obj = create()
+        except BaseException:
+            self._shrink()
+            raise
+        with self._available:
+            self.created += 1
+        return obj
+
+    def _shrink(self):
+        with self._available:
+            self._size -= 1
+            self._available.notify()
+
+    def _filling(self) -> bool:
+        """True for the first caller only, which then builds the first `minimum` instances"""
+        with self._available:
+            if self._filled:
+                return False
+            self._filled = True
+            return True
+
+    def _grow(self) -> bool:
+        """Makes room for one more of the first `minimum` instances, if still short of them"""
+        with self._available:
+            if self._size >= self.minimum:
+                return False
+            self._size += 1
+            return True
+
+    def _fill(self, create: Callable[[], object]):
+        if self._filling():
+            while self._grow():
+                self.release(self._build(create), validate=False)
+
+    async def _afill(self, acreate: Callable[[], Awaitable[object]]):
+        if self._filling():
+            while self._grow():
+                self.release(await self._abuild(acreate), validate=False)
+
+    async def _abuild(self, acreate: Callable[[], Awaitable[object]]):
+        try:
+            obj = await acreate()
+        except BaseException:
+            self._shrink()
+            raise
+        with self._available:
+            self.created += 1
+        return obj
+
+    def acquire(self, create: Callable[[], object], blocking: bool = None, timeout: float = None):
+        """Checks out an instance, calling `create` when a new one is needed. `blocking` and `timeout` default to
+        those of the pool. Every instance acquired has to be given back with `release`.
+        """
+        if not self._filled:
+            self._fill(create)
+        obj = self._reserve(self.blocking if blocking is None else blocking,
+                            self.timeout if timeout is None else timeout)
+        if obj is _NEW:
+            obj = self._build(create)
+        return obj
+
+    async def aacquire(self, acreate: Callable[[], Awaitable[object]], blocking: bool = None, timeout: float = None):
+        """`acquire` for `Compose.aprovide`, waiting for a released instance happens on a worker thread so the event
+        loop keeps going
+        """
+        if not self._filled:
+            await self._afill(acreate)
+        blocking = self.blocking if blocking is None else blocking
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            obj = self._reserve(False, None)
+        except PoolExhausted:
+            if not blocking:
+                raise
+            obj = await asyncio.get_running_loop().run_in_executor(None, self._reserve, True, timeout)
+        if obj is _NEW:
+            obj = await self._abuild(acreate)
+        return obj
+
+    def release(self, obj, validate: bool = True):
+        """Gives a checked out instance back, or drops it when it does not pass `validate`"""
+        if self.closed:
+            self._discard(obj)
+            return
+        if validate and self.validate is not None:
+            try:
+                valid = self.validate(obj)
+            except Exception as ex:
+                logger.warning("Validating %s on its way back to the pool failed: %s", obj, ex)
+                valid = False
+            if not valid:
+                with self._available:
+                    self.discarded += 1
+                self._discard(obj)
+                return
+        with self._available:
+            self._idle.append(obj)
+            self._available.notify()
+
+    def _discard(self, obj):
+        self._shrink()
+        if self.dispose is not None:
+            try:
+                self.dispose(obj)
+            except Exception as ex:
+                logger.exception("Disposing of %s dropped from its pool failed", obj, exc_info=ex)
+
+    def close(self):
+        """Disposes of the idle instances. Instances checked out are disposed of when they are released."""
+        with self._available:
+            self.closed = True
+            idle, self._idle = list(self._idle), deque()
+        for obj in idle:
+            self._discard(obj)
+
+    def stats(self) -> Dict[str, object]:
+        """The size of the pool (instances alive), how many are idle and checked out (in_use) and the most that were
+        ever checked out at once (peak). How many were created, checked out, dropped as invalid (discarded), had to
+        wait (waits, wait_time in seconds) and gave up waiting (timeouts).
+        """
+        with self._available:
+            return {"size": self._size, "idle": len(self._idle), "in_use": self._size - len(self._idle),
+                    "peak": self.peak, "minimum": self.minimum, "maximum": self.maximum, "created": self.created,
+                    "checkouts": self.checkouts, "discarded": self.discarded, "waits": self.waits,
+                    "wait_time": self.wait_time, "timeouts": self.timeouts}
@@ -1,5 +1,9 @@
 # Adapted from PEAK (https://github.com/PEAK-Legacy/ProxyTypes) which seems to be lacking support now
 # this keeps Compose without dependencies which is ideal.
+import inspect
+import threading
+import weakref
+
 
 class CallbackProxy(object):
     """Delegates all operations (except ``.__subject__``) to another object"""
@@ -117,12 +121,20 @@ CallbackProxy.__subject__ = property(lambda self, gc=get_callback: gc(self)())
 
 
 class LazyProxy(CallbackProxy):
-    """Proxy for a lazily-obtained object, that is cached on first use"""
-    __slots__ = "__cache__"
+    """Proxy for a lazily-obtained object, that is cached on first use. The callback is only called once even when
+    several threads get to the proxy at the same time.
+    """
+    __slots__ = ("__cache__", "__lock__")
+
+    def __init__(self, func):
+        set_lock(self, threading.RLock())
+        super().__init__(func)
 
 
 get_cache = LazyProxy.__cache__.__get__
 set_cache = LazyProxy.__cache__.__set__
+get_lock = LazyProxy.__lock__.__get__
+set_lock = LazyProxy.__lock__.__set__
 
 
 def __subject__(self, get_cache=get_cache, set_cache=set_cache):
@@ -130,12 +142,111 @@ def __subject__(self, get_cache=get_cache, set_cache=set_cache):
         return get_cache(self)
     except AttributeError:
         pass
-    try:
-        set_cache(self, get_callback(self)())
-    except BaseException as ex:
-        raise RuntimeError("Proxy called failed") from ex
-    return get_cache(self)
+    with get_lock(self):
+        try:
+            return get_cache(self)
+        except AttributeError:
+            pass
+        try:
+            set_cache(self, get_callback(self)())
+        except BaseException as ex:
+            raise RuntimeError("Proxy called failed") from ex
+        return get_cache(self)
 
 
 LazyProxy.__subject__ = property(__subject__, set_cache)
 del __subject__
+
+
+class _Forward(object):
+    """A method of the proxied class on a `proxy_class`. The first time it is looked up the subject's bound method is
+    kept in the proxy's `__methods__`, after that the call goes straight to the subject.
+    """
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, proxy, owner=None):
+        if proxy is None:
+            return self
+        subject = proxy.__subject__
+        value = getattr(subject, self.name)
+        if getattr(value, "__self__", None) is subject:
+            object.__getattribute__(proxy, "__methods__")[self.name] = value
+        return value
+
+
+def _specialized_init(self, func):
+    object.__setattr__(self, "__methods__", {})
+    LazyProxy.__init__(self, func)
+
+
+def _specialized_getattribute(methods, names):
+    def __getattribute__(self, attr, oga=object.__getattribute__):
+        if attr in methods:
+            try:
+                return oga(self, "__methods__")[attr]
+            except KeyError:
+                return oga(self, attr)
+        if attr in names:
+            return oga(self, attr)
+        return getattr(oga(self, "__subject__"), attr)
+
+    return __getattribute__
+
+
+# One proxy class per proxied class, dropped along with the class
+_proxy_classes = weakref.WeakKeyDictionary()
+
+
+def proxy_class(kls: type) -> type:
+    """The `LazyProxy` subclass for objects of `kls`. The methods of `kls` are looked up on the subject once and kept
+    by the proxy, later calls go straight to the subject. Anything else is read from the subject.
+    """
+    try:
+        return _proxy_classes[kls]
+    except KeyError:
+        pass
+    methods = {}
+    for name in dir(kls):
+        if name.startswith("__") and name.endswith("__"):
+            continue
+        if callable(inspect.getattr_static(kls, name, None)):
+            methods[name] = _Forward(name)
+    namespace = dict(methods)
+    namespace.update({
+        # the bound methods of the subject, kept apart so __dict__ and vars() still show the subject's
+        "__slots__": ("__methods__",),
+        "__init__": _specialized_init,
+        # so isinstance still sees the subject's class
+        "__class__": property(lambda self: self.__subject__.__class__),
+        "__getattribute__": _specialized_getattribute(frozenset(methods), frozenset({"__subject__", "__class__"})),
+    })
+    proxy = _proxy_classes[kls] = type(f"LazyProxy[{kls.__qualname__}]", (LazyProxy,), namespace)
+    return proxy
+
+
+def lazy_proxy(kls, func) -> LazyProxy:
+    """A proxy for the `kls` returned by `func`, specialized for `kls` when it is a class"""
+    if isinstance(kls, type):
+        try:
+            return proxy_class(kls)(func)
+        except TypeError:
+            # not weakly referenceable or can't be inspected
+            pass
+    return LazyProxy(func)
+
+
+def is_proxy(obj) -> bool:
+    """True when `obj` is a proxy, without resolving it"""
+    return issubclass(type(obj), CallbackProxy)
+
+
+def unwrap(obj):
+    """The object behind a `Lazy` proxy, resolving it if need be. Anything else is returned as is. Hot code can unwrap
+    once and skip the proxy from then on.
+    """
+    if is_proxy(obj):
+        return object.__getattribute__(obj, "__subject__")
+    return obj
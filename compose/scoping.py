@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Text, Tuple
+
+from .extras.logging import logger
+
+__all__ = [
+    'Scope',
+    'current_scope'
+]
+
+# The innermost open scope. Threads start without one, asyncio tasks see the scope that was active when they were
+# created.
+_current_scope: ContextVar[Optional['Scope']] = ContextVar("compose_scope", default=None)
+
+
+def current_scope() -> Optional['Scope']:
+    return _current_scope.get()
+
+
+class Scope(object):
+    """Holds the instances of scoped bindings (see `Binding.as_scoped`) for the length of a request or task.
+
+    Scopes are opened with `Compose.scope()` and nest, a scoped binding is cached in the innermost open scope of its
+    container with a matching name. A scope can be shared by several threads or tasks, each binding is still only
+    built once per scope.
+    """
+
+    def __init__(self, compose: 'Compose', name: Text = None):
+        self.compose = compose
+        self.name = name
+        self.parent: Optional[Scope] = None
+        self.closed = False
+        self._instances: Dict[Hashable, object] = {}
+        self._created: List[Tuple[object, Optional[Callable]]] = []
+        self._locks: Dict[Hashable, threading.RLock] = {}
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+
+    def find(self, compose: 'Compose', name: Text = None) -> Optional['Scope']:
+        """Returns the innermost scope, starting with this one, that belongs to `compose` or one of the containers it
+        is a child of (see `Compose.child`) and has the given name
+        """
+        scope = self
+        while scope is not None:
+            if (name is None or scope.name == name) and _lineage(compose, scope.compose):
+                return scope
+            scope = scope.parent
+        return None
+
+    def get(self, key: Hashable, create: Callable[[], object], dispose: Callable = None):
+        """Returns the instance kept under `key`, usually a binding, calling `create` the first time"""
+        try:
+            return self._instances[key]
+        except KeyError:
+            pass
+        with self._locks.setdefault(key, threading.RLock()):
+            if key in self._instances:
+                return self._instances[key]
+            obj = create()
+            self._created.append((obj, dispose))
+            self._instances[key] = obj
+            return obj
+
+    async def aget(self, key: Hashable, acreate: Callable[[], Awaitable[object]], dispose: Callable = None):
+        """`get` for `Compose.aprovide`, tasks sharing the scope wait for the instance being built instead of building
+        their own.
+        """
+        try:
+            return self._instances[key]
+        except KeyError:
+            pass
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._abuild(key, acreate, dispose))
+        return await asyncio.shield(pending)
+
+    async def _abuild(self, key, acreate, dispose):
+        try:
+            obj = await acreate()
+            self._created.append((obj, dispose))
+            self._instances[key] = obj
+            return obj
+        finally:
+            self._pending.pop(key, None)
+
+    def close(self):
+        """Disposes of the scoped instances, newest first, and forgets them"""
+        self.closed = True
+        created, self._created = self._created, []
+        self._instances.clear()
+        self._locks.clear()
+        self._pending.clear()
+        for obj, dispose in reversed(created):
+            if dispose is None:
+                continue
+            try:
+                dispose(obj)
+            except Exception as ex:
+                logger.exception("Disposing of %s at the end of its scope failed", obj, exc_info=ex)
+
+    def __enter__(self):
+        self.parent = _current_scope.get()
+        self._token = _current_scope.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _current_scope.reset(self._token)
+        self.close()
+
+
+def _lineage(compose, ancestor) -> bool:
+    """True when `ancestor` is `compose` or a container `compose` is a child of"""
+    while compose is not None:
+        if compose is ancestor:
+            return True
+        compose = getattr(compose, "_parent", None)
+    return False
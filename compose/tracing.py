@@ -0,0 +1,151 @@
+import json
+import os
+import random
+import threading
+from contextvars import ContextVar
+from itertools import count
+from time import perf_counter_ns
+from typing import Any, Dict, List, Optional, Text
+
+__all__ = [
+    'Span',
+    'Tracer',
+    'MemorySink',
+    'ChromeTraceSink',
+    'JsonLinesSink',
+    'chrome_trace'
+]
+
+# The span being recorded in the current thread or task, parent of the next one started
+_current_span: ContextVar[Optional['Span']] = ContextVar("compose_span", default=None)
+_span_ids = count(1)
+
+
+class Span(object):
+    """One timed step of a resolution. Categories are lookup (finding the bindings for a type), instance (building
+    one binding, dependencies included), call (the factory or hook itself) and hook (a requires/accepts hook,
+    its arguments included). Times are `perf_counter_ns` nanoseconds.
+    """
+    __slots__ = ("id", "parent_id", "name", "category", "start", "end", "thread", "args", "_token")
+
+    def __init__(self, name: Text, category: Text, args: Dict[Text, Any] = None):
+        parent = _current_span.get()
+        self.id = next(_span_ids)
+        self.parent_id = parent.id if parent is not None else None
+        self.name = name
+        self.category = category
+        self.args = args
+        self.thread = threading.get_ident()
+        self.end = None
+        self._token = _current_span.set(self)
+        self.start = perf_counter_ns()
+
+    @property
+    def duration(self) -> int:
+        return self.end - self.start
+
+    def as_dict(self) -> Dict[Text, Any]:
+        return {"id": self.id, "parent_id": self.parent_id, "name": self.name, "category": self.category,
+                "start": self.start, "end": self.end, "thread": self.thread, "args": self.args}
+
+    def as_chrome_event(self) -> Dict[Text, Any]:
+        event = {"name": self.name, "cat": self.category, "ph": "X", "ts": self.start / 1000,
+                 "dur": self.duration / 1000, "pid": os.getpid(), "tid": self.thread}
+        if self.args:
+            event["args"] = self.args
+        return event
+
+
+class Tracer(object):
+    """Hands the spans of sampled resolutions to its sinks. A sink is anything with an `emit(span)` method, `flush()`
+    and `close()` are called when present.
+
+    :param sinks: where finished spans go
+    :param sample_rate: share of `Compose.provide` calls to trace, decided once for the whole resolution
+    """
+
+    def __init__(self, *sinks, sample_rate: float = 1.0):
+        self.sinks = list(sinks)
+        self.sample_rate = sample_rate
+
+    def sample(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def begin(self, name: Text, category: Text, args: Dict[Text, Any] = None) -> Span:
+        return Span(name, category, args)
+
+    def end(self, span: Span):
+        span.end = perf_counter_ns()
+        _current_span.reset(span._token)
+        for sink in self.sinks:
+            sink.emit(span)
+
+    def flush(self):
+        for sink in self.sinks:
+            flush = getattr(sink, "flush", None)
+            if flush is not None:
+                flush()
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close is not None:
+                close()
+
+
+class MemorySink(object):
+    """Keeps the spans in a list"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def emit(self, span: Span):
+        self.spans.append(span)
+
+    def chrome_trace(self) -> Dict[Text, Any]:
+        return chrome_trace(self.spans)
+
+    def clear(self):
+        self.spans.clear()
+
+
+class ChromeTraceSink(MemorySink):
+    """Writes the spans to `path` as Chrome trace-event JSON on `flush` or `close`, open it in chrome://tracing or
+    Perfetto for a flame view. Every flush rewrites the file with everything recorded so far.
+    """
+
+    def __init__(self, path: Text):
+        super().__init__()
+        self.path = path
+
+    def flush(self):
+        with open(self.path, "w") as trace:
+            json.dump(self.chrome_trace(), trace)
+
+    def close(self):
+        self.flush()
+
+
+class JsonLinesSink(object):
+    """Appends each span to `path` as a line of JSON (see `Span.as_dict`) as soon as it finishes"""
+
+    def __init__(self, path: Text):
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        line = json.dumps(span.as_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def chrome_trace(spans: List[Span]) -> Dict[Text, Any]:
+    return {"traceEvents": [span.as_chrome_event() for span in spans], "displayTimeUnit": "ms"}
@@ -1,4 +1,5 @@
-from typing import Generic
+import importlib
+from typing import Generic, Text
 
 from .extras import Undefined
 
@@ -15,4 +16,12 @@ def walk(start_point, yielder):
 
 def is_resolvable(kls):
     from typing import _GenericAlias
-    return isinstance(kls, (type, Generic, _GenericAlias))
\ No newline at end of file
+    return isinstance(kls, (type, Generic, _GenericAlias))
+
+
+def load_object(module: Text, qualname: Text):
+    """Imports the object named `qualname` from `module`"""
+    obj = importlib.import_module(module)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+    return obj
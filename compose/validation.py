@@ -0,0 +1,66 @@
+from typing import Any, Dict
+
+from .context import NotFound
+from .exceptions import ComposeError
+from .extras.generics import is_generic_type
+from .extras.logging import logger
+from .freezing import CompilingContext, LazyRequirement
+from .extras.undef import Undefined
+
+__all__ = [
+    'validate',
+    'root_cause'
+]
+
+
+class ValidatingContext(CompilingContext):
+    """`CompilingContext` without the restrictions of freezing, asynchronous factories and every lifetime are fine"""
+    freezing = False
+
+    def prepare_arg(self, arg, lazy):
+        found = super().prepare_arg(arg, lazy)
+        if isinstance(found, LazyRequirement) and not self.provided(found.arg):
+            return NotFound
+        return found
+
+    def provided(self, kls) -> bool:
+        """Whether a binding provides `kls` here. What it needs is not followed, `Lazy` requirements may be circular."""
+        if is_generic_type(kls):
+            # an empty list or None is fine
+            return True
+        context = self.__class__(kls, self, self.compose)
+        return any(True for _, providers in self.compose.plan(kls, context).providers(context) for _ in providers)
+
+
+def root_cause(error: ComposeError) -> ComposeError:
+    """The innermost Compose error `error` was raised from, the missing, ambiguous or circular requirement instead of
+    the instantiation errors wrapped around it on the way up.
+    """
+    cause = error
+    while isinstance(cause.__cause__, ComposeError):
+        cause = cause.__cause__
+    return cause
+
+
+def validate(compose: 'Compose') -> Dict[Any, Exception]:
+    """Works out what every bound type of `compose` would be built from without building anything, see
+    `Compose.validate`
+    """
+    problems = {}
+    checked = set()
+    for bundle in compose.bundles():
+        for binding in bundle.bindings():
+            kls = binding.bound_to
+            try:
+                if kls in checked:
+                    continue
+                checked.add(kls)
+            except TypeError:
+                continue
+            context = ValidatingContext(target=kls, parent=Undefined, compose=compose)
+            try:
+                compose._only(kls, list(compose.provide_all(kls, context)), context)
+            except Exception as ex:
+                logger.debug("%s failed validation: %s", kls, ex)
+                problems[kls] = root_cause(ex) if isinstance(ex, ComposeError) else ex
+    return problems
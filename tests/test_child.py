@@ -0,0 +1,27 @@
+from compose import Compose
+from compose.bundling import Bind
+
+
+class User(object):
+    def __init__(self, name: str = "root"):
+        self.name = name
+
+
+class Service(object):
+    def __init__(self, user: User):
+        self.user = user
+
+
+def test_child_overrides_stay_out_of_parent_singletons():
+    compose = Compose()
+    with compose.registry():
+        Bind[User].to_self()
+        Bind[Service].to_self().as_singleton()
+    child = compose.child()
+    with child.registry():
+        Bind[User].to(lambda: User("alice"))
+
+    assert child.provide(User).name == "alice"
+    assert child.provide(Service).user.name == "root"
+    assert compose.provide(Service).user.name == "root"
+    assert compose.provide(Service) is child.provide(Service)
@@ -0,0 +1,23 @@
+from compose import Compose
+from compose.bundling import Bind
+
+
+class Dependency(object):
+    pass
+
+
+class Service(object):
+    dependency = None
+
+    def requires(self, dependency: Dependency):
+        self.dependency = dependency
+
+
+def test_frozen_factory_without_return_annotation_runs_hooks():
+    compose = Compose()
+    with compose.registry():
+        Bind[Dependency].to_self()
+        Bind[Service].to(lambda: Service())
+    assert isinstance(compose.provide(Service).dependency, Dependency)
+    frozen = compose.freeze()
+    assert isinstance(frozen.provide(Service).dependency, Dependency)
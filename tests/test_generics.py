@@ -0,0 +1,15 @@
+from typing import Generic, TypeVar
+
+from compose.extras.generics import resolve_type
+
+T = TypeVar("T")
+
+
+class Repository(Generic[T]):
+    pass
+
+
+def test_resolve_type_takes_parent_by_keyword():
+    assert resolve_type(Repository, T, parent=Repository[str]) is str
+    assert resolve_type(Repository, T, parent=Repository[int]) is int
+    assert resolve_type(Repository, T, Repository[str]) is str
@@ -0,0 +1,41 @@
+from compose import Compose, Lazy
+from compose.bundling import Bind
+from compose.exceptions import RequirementNotFound
+
+
+class Missing(object):
+    pass
+
+
+class NeedsMissing(object):
+    def __init__(self, missing: Lazy[Missing]):
+        self.missing = missing
+
+
+class Left(object):
+    def __init__(self, right: Lazy["Right"]):
+        self.right = right
+
+
+class Right(object):
+    def __init__(self, left: Left):
+        self.left = left
+
+
+Left.__init__.__annotations__["right"] = Lazy[Right]
+
+
+def test_validate_reports_missing_lazy_requirement():
+    compose = Compose()
+    with compose.registry():
+        Bind[NeedsMissing].to_self()
+    problems = compose.validate()
+    assert isinstance(problems[NeedsMissing], RequirementNotFound)
+
+
+def test_validate_allows_lazy_cycles():
+    compose = Compose()
+    with compose.registry():
+        Bind[Left].to_self()
+        Bind[Right].to_self()
+    assert compose.validate() == {}
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from compose import Compose
+from compose.bundling import Bind
+from compose.exceptions import WarmupError
+
+
+class Database(object):
+    pass
+
+
+class Broken(object):
+    def __init__(self):
+        raise ValueError("broken")
+
+
+class Client(object):
+    pass
+
+
+async def connect() -> Client:
+    return Client()
+
+
+class Service(object):
+    def __init__(self, database: Database):
+        self.database = database
+
+
+class Worker(object):
+    def __init__(self, client: Client):
+        self.client = client
+
+
+def test_warmup_builds_the_rest_around_async_and_failing_singletons():
+    compose = Compose()
+    with compose.registry():
+        Bind[Database].to_self().as_singleton()
+        Bind[Service].to_self().as_singleton()
+        Bind[Broken].to_self().as_singleton()
+        Bind[Client].to(connect).as_singleton()
+        Bind[Worker].to_self().as_singleton()
+
+    with pytest.raises(WarmupError) as raised:
+        compose.warmup()
+
+    errors = {binding.bound_to: error for binding, error in raised.value.errors.items()}
+    assert list(errors) == [Broken]
+    timings = {binding.bound_to for binding in raised.value.timings}
+    assert timings == {Database, Service}
+    assert compose.provide(Service).database is compose.provide(Database)
+    worker = asyncio.run(compose.aprovide(Worker))
+    assert isinstance(worker.client, Client)